@@ -2,8 +2,9 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from core.database import get_db
+from sqlalchemy import select, insert, func
+from core.database import AsyncSessionLocal, session_scope, month_bucket
+from core.periods import utcnow, month_start, month_starts
 from models.cost_models import NamespaceCostAllocation, CostComparison
 from models.schemas import CostComparisonCreate
 import structlog
@@ -18,23 +19,20 @@ class ComparisonEngine:
     async def compare_costs(
         self,
         comparison_type: str = "month-over-month",
-        cluster_name: str = "default"
-    ) -> List[CostComparison]:
+        cluster_name: str = "default",
+        db: Optional[AsyncSession] = None
+    ) -> List[CostComparisonCreate]:
         """
         Compare costs between current and previous periods
         """
         try:
             # Determine periods based on comparison type
             if comparison_type == "month-over-month":
-                current_end = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                current_start = current_end - timedelta(days=32)
-                current_start = current_start.replace(day=1)
-                
+                current_end = month_start(utcnow())
+                previous_start, current_start = month_starts(current_end, 2)
                 previous_end = current_start
-                previous_start = previous_end - timedelta(days=32)
-                previous_start = previous_start.replace(day=1)
             elif comparison_type == "week-over-week":
-                current_end = datetime.utcnow()
+                current_end = utcnow()
                 current_start = current_end - timedelta(days=7)
                 
                 previous_end = current_start
@@ -42,50 +40,49 @@ class ComparisonEngine:
             else:
                 raise ValueError(f"Unsupported comparison type: {comparison_type}")
             
-            # Get cost data for both periods
-            async for db in get_db():
-                current_costs = await self._get_period_costs(
-                    db, current_start, current_end, cluster_name
-                )
-                previous_costs = await self._get_period_costs(
-                    db, previous_start, previous_end, cluster_name
+            # Get cost data for both periods concurrently; each query needs
+            # its own session since a connection can't run two statements at once
+            async with session_scope(db) as current_db, AsyncSessionLocal() as previous_db:
+                current_costs, previous_costs = await asyncio.gather(
+                    self._get_period_costs(current_db, current_start, current_end, cluster_name),
+                    self._get_period_costs(previous_db, previous_start, previous_end, cluster_name)
                 )
+            
+            # Calculate comparisons
+            comparisons = []
+            all_namespaces = current_costs.keys() | previous_costs.keys()
+            
+            for namespace in all_namespaces:
+                current_cost = current_costs.get(namespace, 0.0)
+                previous_cost = previous_costs.get(namespace, 0.0)
                 
-                # Calculate comparisons
-                comparisons = []
-                all_namespaces = set(current_costs.keys()).union(set(previous_costs.keys()))
+                if previous_cost == 0:
+                    percentage_change = float('inf') if current_cost > 0 else 0.0
+                else:
+                    percentage_change = ((current_cost - previous_cost) / previous_cost) * 100
                 
-                for namespace in all_namespaces:
-                    current_cost = current_costs.get(namespace, 0.0)
-                    previous_cost = previous_costs.get(namespace, 0.0)
-                    
-                    if previous_cost == 0:
-                        percentage_change = float('inf') if current_cost > 0 else 0.0
-                    else:
-                        percentage_change = ((current_cost - previous_cost) / previous_cost) * 100
-                    
-                    absolute_change = current_cost - previous_cost
-                    
-                    comparison = CostComparisonCreate(
-                        namespace=namespace,
-                        cluster_name=cluster_name,
-                        current_period_cost=current_cost,
-                        previous_period_cost=previous_cost,
-                        percentage_change=percentage_change,
-                        absolute_change=absolute_change,
-                        comparison_type=comparison_type,
-                        current_period_start=current_start,
-                        current_period_end=current_end,
-                        previous_period_start=previous_start,
-                        previous_period_end=previous_end
-                    )
-                    
-                    comparisons.append(CostComparison(**comparison.dict()))
+                absolute_change = current_cost - previous_cost
                 
-                return comparisons
+                comparison = CostComparisonCreate(
+                    namespace=namespace,
+                    cluster_name=cluster_name,
+                    current_period_cost=current_cost,
+                    previous_period_cost=previous_cost,
+                    percentage_change=percentage_change,
+                    absolute_change=absolute_change,
+                    comparison_type=comparison_type,
+                    current_period_start=current_start,
+                    current_period_end=current_end,
+                    previous_period_start=previous_start,
+                    previous_period_end=previous_end
+                )
                 
+                comparisons.append(comparison)
+            
+            return comparisons
+            
         except Exception as e:
-            logger.error(f"Error comparing costs: {str(e)}")
+            logger.exception("Error comparing costs", error=str(e))
             raise
     
     async def _get_period_costs(
@@ -99,43 +96,39 @@ class ComparisonEngine:
         Get total costs by namespace for a specific period
         """
         try:
-            query = select(NamespaceCostAllocation).where(
-                and_(
-                    NamespaceCostAllocation.period_start >= period_start,
-                    NamespaceCostAllocation.period_end <= period_end,
-                    NamespaceCostAllocation.cluster_name == cluster_name
-                )
-            )
+            query = select(
+                NamespaceCostAllocation.namespace,
+                func.sum(NamespaceCostAllocation.total_cost).label("total_cost")
+            ).where(
+                NamespaceCostAllocation.period_start >= period_start,
+                NamespaceCostAllocation.period_end <= period_end,
+                NamespaceCostAllocation.cluster_name == cluster_name
+            ).group_by(NamespaceCostAllocation.namespace)
             result = await db.execute(query)
-            allocations = result.scalars().all()
-            
-            # Aggregate by namespace
-            namespace_costs = {}
-            for allocation in allocations:
-                if allocation.namespace not in namespace_costs:
-                    namespace_costs[allocation.namespace] = 0.0
-                namespace_costs[allocation.namespace] += allocation.total_cost
             
-            return namespace_costs
+            return dict(result.all())
             
         except Exception as e:
-            logger.error(f"Error getting period costs: {str(e)}")
+            logger.exception("Error getting period costs", error=str(e))
             return {}
     
-    async def store_comparisons(self, db: AsyncSession, comparisons: List[CostComparison]):
+    async def store_comparisons(self, db: AsyncSession, comparisons: List[CostComparisonCreate]):
         """
         Store cost comparisons in the database
         """
         try:
-            for comparison in comparisons:
-                db.add(comparison)
+            if comparisons:
+                await db.execute(
+                    insert(CostComparison),
+                    [comparison.dict() for comparison in comparisons]
+                )
             
             await db.commit()
-            logger.info(f"Stored {len(comparisons)} cost comparison records")
+            logger.info("Stored cost comparison records", count=len(comparisons))
             
         except Exception as e:
             await db.rollback()
-            logger.error(f"Error storing cost comparisons: {str(e)}")
+            logger.exception("Error storing cost comparisons", error=str(e))
             raise
     
     async def get_cost_trends(
@@ -148,70 +141,70 @@ class ComparisonEngine:
         Get cost trends over time
         """
         try:
-            async for db in get_db():
-                # Get monthly cost data
-                trends = []
-                current_date = datetime.utcnow()
+            # Build the calendar month windows, oldest first
+            period_end = month_start(utcnow())
+            starts = month_starts(period_end, months)
+            
+            month = month_bucket(NamespaceCostAllocation.period_start).label("month")
+            query = select(
+                month,
+                NamespaceCostAllocation.namespace,
+                func.sum(NamespaceCostAllocation.total_cost).label("total_cost")
+            ).where(
+                NamespaceCostAllocation.period_start >= starts[0],
+                NamespaceCostAllocation.period_end <= period_end,
+                NamespaceCostAllocation.cluster_name == cluster_name
+            ).group_by(month, NamespaceCostAllocation.namespace)
+            
+            if namespace:
+                query = query.where(NamespaceCostAllocation.namespace == namespace)
+            
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(query)
                 
-                for i in range(months):
-                    period_end = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                    period_end = period_end - timedelta(days=i * 30)
-                    period_start = period_end - timedelta(days=30)
-                    
-                    query = select(NamespaceCostAllocation).where(
-                        and_(
-                            NamespaceCostAllocation.period_start >= period_start,
-                            NamespaceCostAllocation.period_end <= period_end,
-                            NamespaceCostAllocation.cluster_name == cluster_name
-                        )
-                    )
-                    
-                    if namespace:
-                        query = query.where(NamespaceCostAllocation.namespace == namespace)
-                    
-                    result = await db.execute(query)
-                    allocations = result.scalars().all()
-                    
-                    total_cost = sum(allocation.total_cost for allocation in allocations)
-                    namespace_costs = {}
-                    for allocation in allocations:
-                        namespace_costs[allocation.namespace] = allocation.total_cost
-                    
-                    trends.append({
-                        "period": period_start.strftime("%Y-%m"),
-                        "cost": total_cost,
-                        "namespace_costs": namespace_costs
-                    })
+                # Pivot (month, namespace, cost) rows into one entry per month
+                monthly_costs = {start.strftime("%Y-%m"): {} for start in starts}
+                for row in result:
+                    namespace_costs = monthly_costs.get(row.month)
+                    if namespace_costs is not None:
+                        namespace_costs[row.namespace] = row.total_cost
                 
-                return trends[::-1]  # Reverse to get chronological order
+                return [
+                    {
+                        "period": period,
+                        "cost": sum(namespace_costs.values()),
+                        "namespace_costs": namespace_costs
+                    }
+                    for period, namespace_costs in monthly_costs.items()
+                ]
                 
         except Exception as e:
-            logger.error(f"Error getting cost trends: {str(e)}")
+            logger.exception("Error getting cost trends", error=str(e))
             return []
     
     async def run_comparison(
         self,
         comparison_type: str = "month-over-month",
         cluster_name: str = "default"
-    ):
+    ) -> List[CostComparisonCreate]:
         """
         Run the complete cost comparison
         """
-        logger.info(f"Starting cost comparison: {comparison_type}")
+        logger.info("Starting cost comparison", comparison_type=comparison_type)
         
         try:
-            # Compare costs
-            comparisons = await self.compare_costs(comparison_type, cluster_name)
-            
-            # Store comparisons
-            async for db in get_db():
+            async with AsyncSessionLocal() as db:
+                # Compare costs
+                comparisons = await self.compare_costs(comparison_type, cluster_name, db=db)
+                
+                # Store comparisons
                 await self.store_comparisons(db, comparisons)
             
             logger.info("Cost comparison completed successfully")
             return comparisons
             
         except Exception as e:
-            logger.error(f"Cost comparison failed: {str(e)}")
+            logger.exception("Cost comparison failed", error=str(e))
             raise
 
 
@@ -2,8 +2,9 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from core.database import get_db
+from sqlalchemy import select, insert, func
+from core.database import AsyncSessionLocal, session_scope
+from core.periods import month_start, utcnow
 from models.cost_models import AzureCostData, KubernetesMetrics, NamespaceCostAllocation
 from models.schemas import NamespaceCostAllocationCreate
 import structlog
@@ -21,14 +22,15 @@ class CostAnalyzer:
         self, 
         period_start: datetime, 
         period_end: datetime,
-        cluster_name: str = "default"
-    ) -> List[NamespaceCostAllocation]:
+        cluster_name: str = "default",
+        db: Optional[AsyncSession] = None
+    ) -> List[NamespaceCostAllocationCreate]:
         """
         Calculate cost allocation per namespace based on resource usage
         """
         try:
             # Get Kubernetes metrics for the period
-            async for db in get_db():
+            async with session_scope(db) as db:
                 # Get total cluster cost from Azure data
                 total_azure_cost = await self._get_total_azure_cost(db, period_start, period_end)
                 
@@ -43,20 +45,28 @@ class CostAnalyzer:
                 total_memory_usage = sum(ns['memory_usage_gb_hours'] for ns in namespace_usage.values())
                 total_storage_usage = sum(ns['storage_usage_gb_hours'] for ns in namespace_usage.values())
                 
+                # Each resource type with recorded usage spreads the full Azure cost
+                # across namespaces, so the allocated total is known before the loop
+                allocated_cost = sum(
+                    total_azure_cost
+                    for total_usage in (total_cpu_usage, total_memory_usage, total_storage_usage)
+                    if total_usage > 0
+                )
+                other_cost = max(0, total_azure_cost - allocated_cost)
+                
+                # Price per unit of usage, so each namespace needs only multiplications
+                cpu_price = total_azure_cost / total_cpu_usage if total_cpu_usage > 0 else 0.0
+                memory_price = total_azure_cost / total_memory_usage if total_memory_usage > 0 else 0.0
+                storage_price = total_azure_cost / total_storage_usage if total_storage_usage > 0 else 0.0
+                
                 for namespace, usage in namespace_usage.items():
                     # Calculate cost components
-                    cpu_cost = (usage['cpu_usage_hours'] / total_cpu_usage) * total_azure_cost if total_cpu_usage > 0 else 0
-                    memory_cost = (usage['memory_usage_gb_hours'] / total_memory_usage) * total_azure_cost if total_memory_usage > 0 else 0
-                    storage_cost = (usage['storage_usage_gb_hours'] / total_storage_usage) * total_azure_cost if total_storage_usage > 0 else 0
-                    
-                    # Alternative calculation using fixed rates
-                    cpu_cost_fixed = usage['cpu_usage_hours'] * self.cpu_cost_per_core
-                    memory_cost_fixed = usage['memory_usage_gb_hours'] * self.memory_cost_per_gb
-                    storage_cost_fixed = usage['storage_usage_gb_hours'] * self.storage_cost_per_gb
+                    cpu_cost = usage['cpu_usage_hours'] * cpu_price
+                    memory_cost = usage['memory_usage_gb_hours'] * memory_price
+                    storage_cost = usage['storage_usage_gb_hours'] * storage_price
                     
                     # Use proportional allocation of actual Azure costs
                     total_cost = cpu_cost + memory_cost + storage_cost
-                    other_cost = max(0, total_azure_cost - sum(cpu_cost + memory_cost + storage_cost for ns in namespace_usage.values()))
                     
                     allocation = NamespaceCostAllocationCreate(
                         namespace=namespace,
@@ -72,12 +82,12 @@ class CostAnalyzer:
                         allocation_method="resource_usage"
                     )
                     
-                    allocations.append(NamespaceCostAllocation(**allocation.dict()))
+                    allocations.append(allocation)
                 
                 return allocations
                 
         except Exception as e:
-            logger.error(f"Error calculating namespace costs: {str(e)}")
+            logger.exception("Error calculating namespace costs", error=str(e))
             raise
     
     async def _get_total_azure_cost(
@@ -91,17 +101,15 @@ class CostAnalyzer:
         """
         try:
             query = select(func.sum(AzureCostData.cost)).where(
-                and_(
-                    AzureCostData.date >= period_start,
-                    AzureCostData.date <= period_end
-                )
+                AzureCostData.date >= period_start,
+                AzureCostData.date <= period_end
             )
             result = await db.execute(query)
             total_cost = result.scalar() or 0.0
             return total_cost
             
         except Exception as e:
-            logger.error(f"Error getting total Azure cost: {str(e)}")
+            logger.exception("Error getting total Azure cost", error=str(e))
             return 0.0
     
     async def _get_namespace_resource_usage(
@@ -115,64 +123,56 @@ class CostAnalyzer:
         Get aggregated resource usage by namespace
         """
         try:
-            # Get metrics for the period
-            query = select(KubernetesMetrics).where(
-                and_(
-                    KubernetesMetrics.timestamp >= period_start,
-                    KubernetesMetrics.timestamp <= period_end,
-                    KubernetesMetrics.cluster_name == cluster_name
-                )
-            )
+            # Average usage by namespace in the database
+            query = select(
+                KubernetesMetrics.namespace,
+                func.avg(KubernetesMetrics.cpu_usage),
+                func.avg(KubernetesMetrics.memory_usage),
+                func.avg(KubernetesMetrics.storage_usage),
+                func.count()
+            ).where(
+                KubernetesMetrics.timestamp >= period_start,
+                KubernetesMetrics.timestamp <= period_end,
+                KubernetesMetrics.cluster_name == cluster_name
+            ).group_by(KubernetesMetrics.namespace)
             result = await db.execute(query)
-            metrics = result.scalars().all()
             
-            # Aggregate by namespace
             namespace_usage = {}
             hours_in_period = (period_end - period_start).total_seconds() / 3600
+            gb_hours_in_period = hours_in_period / (1024**3)
             
-            for metric in metrics:
-                namespace = metric.namespace
-                if namespace not in namespace_usage:
-                    namespace_usage[namespace] = {
-                        'cpu_usage_hours': 0.0,
-                        'memory_usage_gb_hours': 0.0,
-                        'storage_usage_gb_hours': 0.0,
-                        'sample_count': 0
-                    }
-                
-                # Convert units and accumulate
-                namespace_usage[namespace]['cpu_usage_hours'] += metric.cpu_usage * hours_in_period
-                namespace_usage[namespace]['memory_usage_gb_hours'] += (metric.memory_usage / (1024**3)) * hours_in_period
-                namespace_usage[namespace]['storage_usage_gb_hours'] += (metric.storage_usage / (1024**3)) * hours_in_period
-                namespace_usage[namespace]['sample_count'] += 1
-            
-            # Average out the usage if we have multiple samples
-            for namespace in namespace_usage:
-                if namespace_usage[namespace]['sample_count'] > 1:
-                    namespace_usage[namespace]['cpu_usage_hours'] /= namespace_usage[namespace]['sample_count']
-                    namespace_usage[namespace]['memory_usage_gb_hours'] /= namespace_usage[namespace]['sample_count']
-                    namespace_usage[namespace]['storage_usage_gb_hours'] /= namespace_usage[namespace]['sample_count']
+            for namespace, cpu_avg, memory_avg, storage_avg, sample_count in result.all():
+                # Convert units to usage over the period
+                namespace_usage[namespace] = {
+                    'cpu_usage_hours': (cpu_avg or 0.0) * hours_in_period,
+                    'memory_usage_gb_hours': (memory_avg or 0.0) * gb_hours_in_period,
+                    'storage_usage_gb_hours': (storage_avg or 0.0) * gb_hours_in_period,
+                    'sample_count': sample_count
+                }
             
             return namespace_usage
             
         except Exception as e:
-            logger.error(f"Error getting namespace resource usage: {str(e)}")
+            logger.exception("Error getting namespace resource usage", error=str(e))
             return {}
     
-    async def store_cost_allocations(self, db: AsyncSession, allocations: List[NamespaceCostAllocation]):
+    async def store_cost_allocations(self, db: AsyncSession, allocations: List[NamespaceCostAllocationCreate]):
         """
         Store cost allocations in the database
         """
         try:
-            for allocation in allocations:
-                db.add(allocation)
+            if allocations:
+                await db.execute(
+                    insert(NamespaceCostAllocation),
+                    [allocation.dict() for allocation in allocations]
+                )
             
             await db.commit()
-            logger.info(f"Stored {len(allocations)} cost allocation records")
+            logger.info("Stored cost allocation records", count=len(allocations))
             
         except Exception as e:
             await db.rollback()
-            logger.error(f"Error storing cost allocations: {str(e)}")
+            logger.exception("Error storing cost allocations", error=str(e))
             raise
     
     async def run_analysis(
@@ -180,30 +180,32 @@ class CostAnalyzer:
         period_start: datetime = None, 
         period_end: datetime = None,
         cluster_name: str = "default"
-    ):
+    ) -> List[NamespaceCostAllocationCreate]:
         """
         Run the complete cost analysis
         """
         if not period_start:
-            period_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            period_start = month_start(utcnow())
         if not period_end:
             period_end = period_start + timedelta(days=30)
         
-        logger.info(f"Starting cost analysis for period {period_start} to {period_end}")
+        logger.info("Starting cost analysis", period_start=period_start, period_end=period_end)
         
         try:
-            # Calculate namespace costs
-            allocations = await self.calculate_namespace_costs(period_start, period_end, cluster_name)
-            
-            # Store allocations
-            async for db in get_db():
+            async with AsyncSessionLocal() as db:
+                # Calculate namespace costs
+                allocations = await self.calculate_namespace_costs(
+                    period_start, period_end, cluster_name, db=db
+                )
+                
+                # Store allocations
                 await self.store_cost_allocations(db, allocations)
             
             logger.info("Cost analysis completed successfully")
             return allocations
             
         except Exception as e:
-            logger.error(f"Cost analysis failed: {str(e)}")
+            logger.exception("Cost analysis failed", error=str(e))
             raise
 
 
@@ -1,19 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from datetime import datetime, timedelta
+from sqlalchemy import select, func, case
+from datetime import timedelta
+from statistics import linear_regression
 from typing import List, Optional, Dict, Any
+import asyncio
 import structlog
 
-from core.database import get_db
+from core.cache import cached
+from core.database import get_db, AsyncSessionLocal, month_bucket
+from core.periods import utcnow, month_start, month_starts, add_months
 from models.cost_models import CostComparison, NamespaceCostAllocation, OptimizationRecommendation
-from models.schemas import CostComparison
+from models.schemas import CostComparison as CostComparisonSchema
 
 logger = structlog.get_logger()
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+# (poor below, good above) utilization thresholds per resource
+CPU_EFFICIENCY_THRESHOLDS = (0.1, 0.3)
+MEMORY_EFFICIENCY_THRESHOLDS = (0.1, 0.4)
+STORAGE_EFFICIENCY_THRESHOLDS = (0.05, 0.2)
 
-@router.get("/comparisons", response_model=List[CostComparison])
+
+def _efficiency_score(utilization: float, thresholds) -> str:
+    poor_below, good_above = thresholds
+    if utilization > good_above:
+        return "good"
+    if utilization < poor_below:
+        return "poor"
+    return "moderate"
+
+
+@router.get("/comparisons", response_model=List[CostComparisonSchema])
 async def get_cost_comparisons(
     comparison_type: Optional[str] = Query("month-over-month"),
     namespace: Optional[str] = Query(None),
@@ -25,11 +43,9 @@ async def get_cost_comparisons(
     Get cost comparisons between periods
     """
     try:
-        query = select(CostComparison).where(
-            and_(
-                CostComparison.comparison_type == comparison_type,
-                CostComparison.cluster_name == cluster_name
-            )
+        query = select(CostComparison.__table__).where(
+            CostComparison.comparison_type == comparison_type,
+            CostComparison.cluster_name == cluster_name
         )
         
         if namespace:
@@ -38,16 +54,17 @@ async def get_cost_comparisons(
         query = query.order_by(CostComparison.current_period_start.desc()).limit(limit)
         
         result = await db.execute(query)
-        comparisons = result.scalars().all()
         
-        return comparisons
+        # Rows come straight from our own table, so skip re-validating each model
+        return [CostComparisonSchema.model_construct(**comparison) for comparison in result.mappings()]
         
     except Exception as e:
-        logger.error(f"Error getting cost comparisons: {str(e)}")
+        logger.exception("Error getting cost comparisons", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get cost comparisons")
 
 
 @router.get("/efficiency-metrics")
+@cached(ttl=30)
 async def get_efficiency_metrics(
     namespace: Optional[str] = Query(None),
     cluster_name: Optional[str] = Query("default"),
@@ -60,82 +77,66 @@ async def get_efficiency_metrics(
     try:
         from models.cost_models import KubernetesMetrics
         
-        period_start = datetime.utcnow() - timedelta(days=days_back)
-        period_end = datetime.utcnow()
-        
-        # Get Kubernetes metrics for the period
-        query = select(KubernetesMetrics).where(
-            and_(
-                KubernetesMetrics.timestamp >= period_start,
-                KubernetesMetrics.timestamp <= period_end,
-                KubernetesMetrics.cluster_name == cluster_name
-            )
-        )
+        period_end = utcnow()
+        period_start = period_end - timedelta(days=days_back)
+        
+        # Average the utilization ratios per namespace in the database
+        query = select(
+            KubernetesMetrics.namespace,
+            func.avg(case(
+                (KubernetesMetrics.cpu_requests > 0, KubernetesMetrics.cpu_usage / KubernetesMetrics.cpu_requests),
+                else_=0
+            )).label("cpu_utilization"),
+            func.avg(case(
+                (KubernetesMetrics.memory_requests > 0, KubernetesMetrics.memory_usage / KubernetesMetrics.memory_requests),
+                else_=0
+            )).label("memory_utilization"),
+            func.avg(case(
+                (KubernetesMetrics.storage_requests > 0, KubernetesMetrics.storage_usage / KubernetesMetrics.storage_requests),
+                else_=0
+            )).label("storage_utilization"),
+            func.count().label("sample_count")
+        ).where(
+            KubernetesMetrics.timestamp >= period_start,
+            KubernetesMetrics.timestamp <= period_end,
+            KubernetesMetrics.cluster_name == cluster_name
+        ).group_by(KubernetesMetrics.namespace)
         
         if namespace:
             query = query.where(KubernetesMetrics.namespace == namespace)
         
         result = await db.execute(query)
-        metrics = result.scalars().all()
+        rows = result.all()
         
-        if not metrics:
+        if not rows:
             return {"message": "No metrics data available for the specified period"}
         
-        # Calculate efficiency metrics
-        efficiency_data = {}
-        
-        for metric in metrics:
-            ns = metric.namespace
-            if ns not in efficiency_data:
-                efficiency_data[ns] = {
-                    "cpu_utilization_samples": [],
-                    "memory_utilization_samples": [],
-                    "storage_utilization_samples": []
-                }
-            
-            # Calculate utilization ratios
-            cpu_utilization = (
-                metric.cpu_usage / metric.cpu_requests 
-                if metric.cpu_requests > 0 else 0
-            )
-            memory_utilization = (
-                metric.memory_usage / metric.memory_requests 
-                if metric.memory_requests > 0 else 0
-            )
-            storage_utilization = (
-                metric.storage_usage / metric.storage_requests 
-                if metric.storage_requests > 0 else 0
-            )
-            
-            efficiency_data[ns]["cpu_utilization_samples"].append(cpu_utilization)
-            efficiency_data[ns]["memory_utilization_samples"].append(memory_utilization)
-            efficiency_data[ns]["storage_utilization_samples"].append(storage_utilization)
-        
-        # Calculate averages and identify inefficiencies
+        # Identify inefficiencies from the averages
         results = {}
-        for ns, data in efficiency_data.items():
-            avg_cpu_utilization = sum(data["cpu_utilization_samples"]) / len(data["cpu_utilization_samples"])
-            avg_memory_utilization = sum(data["memory_utilization_samples"]) / len(data["memory_utilization_samples"])
-            avg_storage_utilization = sum(data["storage_utilization_samples"]) / len(data["storage_utilization_samples"])
+        for row in rows:
+            avg_cpu_utilization = row.cpu_utilization
+            avg_memory_utilization = row.memory_utilization
+            avg_storage_utilization = row.storage_utilization
             
-            results[ns] = {
+            results[row.namespace] = {
                 "avg_cpu_utilization": round(avg_cpu_utilization, 3),
                 "avg_memory_utilization": round(avg_memory_utilization, 3),
                 "avg_storage_utilization": round(avg_storage_utilization, 3),
-                "cpu_efficiency_score": "good" if avg_cpu_utilization > 0.3 else "poor" if avg_cpu_utilization < 0.1 else "moderate",
-                "memory_efficiency_score": "good" if avg_memory_utilization > 0.4 else "poor" if avg_memory_utilization < 0.1 else "moderate",
-                "storage_efficiency_score": "good" if avg_storage_utilization > 0.2 else "poor" if avg_storage_utilization < 0.05 else "moderate",
-                "sample_count": len(data["cpu_utilization_samples"])
+                "cpu_efficiency_score": _efficiency_score(avg_cpu_utilization, CPU_EFFICIENCY_THRESHOLDS),
+                "memory_efficiency_score": _efficiency_score(avg_memory_utilization, MEMORY_EFFICIENCY_THRESHOLDS),
+                "storage_efficiency_score": _efficiency_score(avg_storage_utilization, STORAGE_EFFICIENCY_THRESHOLDS),
+                "sample_count": row.sample_count
             }
         
         return results
         
     except Exception as e:
-        logger.error(f"Error getting efficiency metrics: {str(e)}")
+        logger.exception("Error getting efficiency metrics", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get efficiency metrics")
 
 
 @router.get("/cost-forecast")
+@cached(ttl=300)
 async def get_cost_forecast(
     namespace: Optional[str] = Query(None),
     cluster_name: Optional[str] = Query("default"),
@@ -146,58 +147,41 @@ async def get_cost_forecast(
     Get cost forecast based on historical trends
     """
     try:
-        # Get historical cost data
-        trends = []
-        current_date = datetime.utcnow()
+        # Get historical cost data, double the months for better prediction
+        period_end = month_start(utcnow())
+        starts = month_starts(period_end, months * 2)
+        
+        month = month_bucket(NamespaceCostAllocation.period_start).label("month")
+        query = select(
+            month,
+            func.sum(NamespaceCostAllocation.total_cost).label("total_cost")
+        ).where(
+            NamespaceCostAllocation.period_start >= starts[0],
+            NamespaceCostAllocation.period_end <= period_end,
+            NamespaceCostAllocation.cluster_name == cluster_name
+        ).group_by(month)
         
-        for i in range(months * 2):  # Get double the months for better prediction
-            period_end = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            period_end = period_end - timedelta(days=i * 30)
-            period_start = period_end - timedelta(days=30)
-            
-            query = select(NamespaceCostAllocation).where(
-                and_(
-                    NamespaceCostAllocation.period_start >= period_start,
-                    NamespaceCostAllocation.period_end <= period_end,
-                    NamespaceCostAllocation.cluster_name == cluster_name
-                )
-            )
-            
-            if namespace:
-                query = query.where(NamespaceCostAllocation.namespace == namespace)
-            
-            result = await db.execute(query)
-            allocations = result.scalars().all()
-            
-            total_cost = sum(allocation.total_cost for allocation in allocations)
+        if namespace:
+            query = query.where(NamespaceCostAllocation.namespace == namespace)
+        
+        result = await db.execute(query)
+        monthly_costs = {row.month: row.total_cost for row in result}
+        
+        trends = []
+        for start in starts:
+            period = start.strftime("%Y-%m")
             trends.append({
-                "period": period_start.strftime("%Y-%m"),
-                "cost": total_cost
+                "period": period,
+                "cost": monthly_costs.get(period, 0)
             })
         
-        trends = trends[::-1]  # Reverse to get chronological order
-        
         if len(trends) < 2:
             return {"message": "Insufficient historical data for forecasting"}
         
         # Simple linear regression for forecasting
-        def linear_regression(x_values, y_values):
-            n = len(x_values)
-            sum_x = sum(x_values)
-            sum_y = sum(y_values)
-            sum_xy = sum(x * y for x, y in zip(x_values, y_values))
-            sum_x2 = sum(x * x for x in x_values)
-            
-            slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x * sum_x)
-            intercept = (sum_y - slope * sum_x) / n
-            
-            return slope, intercept
-        
-        # Prepare data for regression
-        x_values = list(range(len(trends)))
-        y_values = [trend["cost"] for trend in trends]
-        
-        slope, intercept = linear_regression(x_values, y_values)
+        slope, intercept = linear_regression(
+            range(len(trends)), [trend["cost"] for trend in trends]
+        )
         
         # Generate forecast
         forecast = []
@@ -206,8 +190,7 @@ async def get_cost_forecast(
             predicted_cost = slope * future_x + intercept
             
             # Calculate forecast period
-            forecast_date = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            forecast_date = forecast_date + timedelta(days=i * 30)
+            forecast_date = add_months(period_end, i - 1)
             
             forecast.append({
                 "period": forecast_date.strftime("%Y-%m"),
@@ -227,11 +210,12 @@ async def get_cost_forecast(
         }
         
     except Exception as e:
-        logger.error(f"Error getting cost forecast: {str(e)}")
+        logger.exception("Error getting cost forecast", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get cost forecast")
 
 
 @router.get("/top-spenders")
+@cached(ttl=30)
 async def get_top_spenders(
     cluster_name: Optional[str] = Query("default"),
     period_months: int = Query(1, ge=1, le=12),
@@ -242,44 +226,45 @@ async def get_top_spenders(
     Get top spending namespaces or resources
     """
     try:
-        period_start = datetime.utcnow() - timedelta(days=period_months * 30)
-        period_end = datetime.utcnow()
+        period_end = utcnow()
+        period_start = add_months(period_end, -period_months)
         
         # Get top spending namespaces
         namespace_query = select(
             NamespaceCostAllocation.namespace,
             func.sum(NamespaceCostAllocation.total_cost).label("total_cost"),
-            func.count(NamespaceCostAllocation.id).label("record_count")
+            func.count(NamespaceCostAllocation.id).label("record_count"),
+            (func.sum(NamespaceCostAllocation.total_cost) / period_months).label("average_monthly_cost")
         ).where(
-            and_(
-                NamespaceCostAllocation.period_start >= period_start,
-                NamespaceCostAllocation.period_end <= period_end,
-                NamespaceCostAllocation.cluster_name == cluster_name
-            )
+            NamespaceCostAllocation.period_start >= period_start,
+            NamespaceCostAllocation.period_end <= period_end,
+            NamespaceCostAllocation.cluster_name == cluster_name
         ).group_by(NamespaceCostAllocation.namespace).order_by(
             func.sum(NamespaceCostAllocation.total_cost).desc()
         ).limit(limit)
         
-        namespace_result = await db.execute(namespace_query)
-        top_namespaces = namespace_result.all()
-        
         # Get top spending Azure services
         from models.cost_models import AzureCostData
         
         service_query = select(
             AzureCostData.service_name,
             func.sum(AzureCostData.cost).label("total_cost"),
-            func.count(AzureCostData.id).label("record_count")
+            func.count(AzureCostData.id).label("record_count"),
+            (func.sum(AzureCostData.cost) / period_months).label("average_monthly_cost")
         ).where(
-            and_(
-                AzureCostData.date >= period_start,
-                AzureCostData.date <= period_end
-            )
+            AzureCostData.date >= period_start,
+            AzureCostData.date <= period_end
         ).group_by(AzureCostData.service_name).order_by(
             func.sum(AzureCostData.cost).desc()
         ).limit(limit)
         
-        service_result = await db.execute(service_query)
+        # Run both on separate connections so neither waits on the other
+        async with AsyncSessionLocal() as service_db:
+            namespace_result, service_result = await asyncio.gather(
+                db.execute(namespace_query),
+                service_db.execute(service_query)
+            )
+        top_namespaces = namespace_result.all()
         top_services = service_result.all()
         
         return {
@@ -293,7 +278,7 @@ async def get_top_spenders(
                     "namespace": ns.namespace,
                     "total_cost": ns.total_cost,
                     "record_count": ns.record_count,
-                    "average_monthly_cost": ns.total_cost / period_months
+                    "average_monthly_cost": ns.average_monthly_cost
                 }
                 for ns in top_namespaces
             ],
@@ -302,12 +287,12 @@ async def get_top_spenders(
                     "service_name": service.service_name,
                     "total_cost": service.total_cost,
                     "record_count": service.record_count,
-                    "average_monthly_cost": service.total_cost / period_months
+                    "average_monthly_cost": service.average_monthly_cost
                 }
                 for service in top_services
             ]
         }
         
     except Exception as e:
-        logger.error(f"Error getting top spenders: {str(e)}")
+        logger.exception("Error getting top spenders", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get top spenders")
@@ -1,22 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func
 from datetime import datetime, timedelta
 from typing import List, Optional
+import asyncio
 import structlog
 
-from core.database import get_db
+from core.cache import cached
+from core.database import get_db, AsyncSessionLocal, month_bucket
+from core.periods import utcnow, month_start, month_starts, add_months
 from models.cost_models import AzureCostData, NamespaceCostAllocation, KubernetesMetrics
-from models.schemas import (
-    CostOverviewResponse, NamespaceCostResponse, CostTrendResponse,
-    NamespaceCostAllocation
-)
+from models.schemas import CostOverviewResponse, NamespaceCostResponse, CostTrendResponse
 
 logger = structlog.get_logger()
 router = APIRouter(prefix="/costs", tags=["costs"])
 
 
 @router.get("/overview", response_model=CostOverviewResponse)
+@cached(ttl=30)
 async def get_cost_overview(
     period_start: Optional[datetime] = Query(None),
     period_end: Optional[datetime] = Query(None),
@@ -27,45 +29,37 @@ async def get_cost_overview(
     """
     try:
         if not period_start:
-            period_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            period_start = month_start(utcnow())
         if not period_end:
-            period_end = period_start + timedelta(days=32)
-        
-        # Get total Azure cost
-        azure_query = select(func.sum(AzureCostData.cost)).where(
-            and_(
-                AzureCostData.date >= period_start,
-                AzureCostData.date <= period_end
-            )
-        )
-        azure_result = await db.execute(azure_query)
-        total_azure_cost = azure_result.scalar() or 0.0
+            period_end = add_months(period_start, 1)
         
         # Get total Kubernetes allocated cost
         k8s_query = select(func.sum(NamespaceCostAllocation.total_cost)).where(
-            and_(
-                NamespaceCostAllocation.period_start >= period_start,
-                NamespaceCostAllocation.period_end <= period_end
-            )
+            NamespaceCostAllocation.period_start >= period_start,
+            NamespaceCostAllocation.period_end <= period_end
         )
-        k8s_result = await db.execute(k8s_query)
-        total_k8s_cost = k8s_result.scalar() or 0.0
         
-        # Get cost breakdown by service
+        # Get cost breakdown by service, which also sums to the total Azure cost
         service_breakdown_query = select(
             AzureCostData.service_name,
             func.sum(AzureCostData.cost).label("total_cost")
         ).where(
-            and_(
-                AzureCostData.date >= period_start,
-                AzureCostData.date <= period_end
-            )
+            AzureCostData.date >= period_start,
+            AzureCostData.date <= period_end
         ).group_by(AzureCostData.service_name)
         
-        service_result = await db.execute(service_breakdown_query)
+        # Run both on separate connections so neither waits on the other
+        async with AsyncSessionLocal() as service_db:
+            k8s_result, service_result = await asyncio.gather(
+                db.execute(k8s_query),
+                service_db.execute(service_breakdown_query)
+            )
+        
+        total_k8s_cost = k8s_result.scalar() or 0.0
         cost_breakdown = {row.service_name: row.total_cost for row in service_result}
+        total_azure_cost = sum(cost or 0.0 for cost in cost_breakdown.values())
         
-        return CostOverviewResponse(
+        return CostOverviewResponse.model_construct(
             total_cost=total_azure_cost,
             azure_cost=total_azure_cost,
             kubernetes_cost=total_k8s_cost,
@@ -75,7 +69,7 @@ async def get_cost_overview(
         )
         
     except Exception as e:
-        logger.error(f"Error getting cost overview: {str(e)}")
+        logger.exception("Error getting cost overview", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get cost overview")
 
 
@@ -92,51 +86,64 @@ async def get_namespace_costs(
     """
     try:
         if not period_start:
-            period_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            period_start = month_start(utcnow())
         if not period_end:
-            period_end = period_start + timedelta(days=32)
+            period_end = add_months(period_start, 1)
         
-        query = select(NamespaceCostAllocation).where(
-            and_(
-                NamespaceCostAllocation.period_start >= period_start,
-                NamespaceCostAllocation.period_end <= period_end,
-                NamespaceCostAllocation.cluster_name == cluster_name
-            )
+        query = select(
+            NamespaceCostAllocation.namespace,
+            NamespaceCostAllocation.cluster_name,
+            NamespaceCostAllocation.total_cost,
+            NamespaceCostAllocation.cpu_cost,
+            NamespaceCostAllocation.memory_cost,
+            NamespaceCostAllocation.storage_cost,
+            NamespaceCostAllocation.network_cost,
+            NamespaceCostAllocation.other_cost,
+            NamespaceCostAllocation.period_start,
+            NamespaceCostAllocation.period_end
+        ).where(
+            NamespaceCostAllocation.period_start >= period_start,
+            NamespaceCostAllocation.period_end <= period_end,
+            NamespaceCostAllocation.cluster_name == cluster_name
         )
         
         if namespace:
             query = query.where(NamespaceCostAllocation.namespace == namespace)
         
         result = await db.execute(query)
-        allocations = result.scalars().all()
         
-        namespace_costs = []
-        for allocation in allocations:
-            cost_breakdown = {
-                "cpu": allocation.cpu_cost,
-                "memory": allocation.memory_cost,
-                "storage": allocation.storage_cost,
-                "network": allocation.network_cost,
-                "other": allocation.other_cost
-            }
-            
-            namespace_costs.append(NamespaceCostResponse(
-                namespace=allocation.namespace,
-                cluster_name=allocation.cluster_name,
-                total_cost=allocation.total_cost,
-                cost_breakdown=cost_breakdown,
-                period_start=allocation.period_start,
-                period_end=allocation.period_end
-            ))
+        # Rows come straight from our own table, so skip re-validating each model
+        namespace_costs = [
+            NamespaceCostResponse.model_construct(
+                namespace=allocation_namespace,
+                cluster_name=allocation_cluster,
+                total_cost=total_cost,
+                cost_breakdown={
+                    "cpu": cpu_cost,
+                    "memory": memory_cost,
+                    "storage": storage_cost,
+                    "network": network_cost,
+                    "other": other_cost
+                },
+                period_start=allocation_start,
+                period_end=allocation_end
+            )
+            for (
+                allocation_namespace, allocation_cluster, total_cost,
+                cpu_cost, memory_cost, storage_cost, network_cost, other_cost,
+                allocation_start, allocation_end
+            ) in result
+        ]
         
         return namespace_costs
         
     except Exception as e:
-        logger.error(f"Error getting namespace costs: {str(e)}")
+        logger.exception("Error getting namespace costs", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get namespace costs")
 
 
 @router.get("/trends", response_model=List[CostTrendResponse])
+@cached(ttl=300)
 async def get_cost_trends(
     namespace: Optional[str] = Query(None),
     cluster_name: Optional[str] = Query("default"),
@@ -147,43 +154,44 @@ async def get_cost_trends(
     Get cost trends over time
     """
     try:
-        trends = []
-        current_date = datetime.utcnow()
+        period_end = month_start(utcnow())
+        starts = month_starts(period_end, months)
         
-        for i in range(months):
-            period_end = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            period_end = period_end - timedelta(days=i * 30)
-            period_start = period_end - timedelta(days=30)
-            
-            query = select(NamespaceCostAllocation).where(
-                and_(
-                    NamespaceCostAllocation.period_start >= period_start,
-                    NamespaceCostAllocation.period_end <= period_end,
-                    NamespaceCostAllocation.cluster_name == cluster_name
-                )
-            )
-            
-            if namespace:
-                query = query.where(NamespaceCostAllocation.namespace == namespace)
-            
-            result = await db.execute(query)
-            allocations = result.scalars().all()
-            
-            total_cost = sum(allocation.total_cost for allocation in allocations)
-            namespace_costs = {}
-            for allocation in allocations:
-                namespace_costs[allocation.namespace] = allocation.total_cost
-            
-            trends.append(CostTrendResponse(
-                period=period_start.strftime("%Y-%m"),
-                cost=total_cost,
-                namespace_costs=namespace_costs
-            ))
+        # One grouped query covering every month in the window
+        month = month_bucket(NamespaceCostAllocation.period_start).label("month")
+        query = select(
+            month,
+            NamespaceCostAllocation.namespace,
+            func.sum(NamespaceCostAllocation.total_cost).label("total_cost")
+        ).where(
+            NamespaceCostAllocation.period_start >= starts[0],
+            NamespaceCostAllocation.period_end <= period_end,
+            NamespaceCostAllocation.cluster_name == cluster_name
+        ).group_by(month, NamespaceCostAllocation.namespace)
         
-        return trends[::-1]  # Reverse to get chronological order
+        if namespace:
+            query = query.where(NamespaceCostAllocation.namespace == namespace)
+        
+        result = await db.execute(query)
+        
+        # Pivot (month, namespace, cost) rows into one entry per month, oldest first
+        monthly_costs = {start.strftime("%Y-%m"): {} for start in starts}
+        for row in result:
+            namespace_costs = monthly_costs.get(row.month)
+            if namespace_costs is not None:
+                namespace_costs[row.namespace] = row.total_cost
+        
+        return [
+            CostTrendResponse.model_construct(
+                period=period,
+                cost=sum(namespace_costs.values()),
+                namespace_costs=namespace_costs
+            )
+            for period, namespace_costs in monthly_costs.items()
+        ]
         
     except Exception as e:
-        logger.error(f"Error getting cost trends: {str(e)}")
+        logger.exception("Error getting cost trends", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get cost trends")
 
 
@@ -193,6 +201,8 @@ async def get_azure_costs(
     period_end: Optional[datetime] = Query(None),
     resource_group: Optional[str] = Query(None),
     service_name: Optional[str] = Query(None),
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -200,15 +210,24 @@ async def get_azure_costs(
     """
     try:
         if not period_start:
-            period_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            period_start = month_start(utcnow())
         if not period_end:
-            period_end = period_start + timedelta(days=32)
+            period_end = add_months(period_start, 1)
         
-        query = select(AzureCostData).where(
-            and_(
-                AzureCostData.date >= period_start,
-                AzureCostData.date <= period_end
-            )
+        query = select(
+            AzureCostData.id,
+            AzureCostData.subscription_id,
+            AzureCostData.resource_group,
+            AzureCostData.resource_name,
+            AzureCostData.resource_type,
+            AzureCostData.service_name,
+            AzureCostData.cost,
+            AzureCostData.currency,
+            AzureCostData.date,
+            AzureCostData.tags
+        ).where(
+            AzureCostData.date >= period_start,
+            AzureCostData.date <= period_end
         )
         
         if resource_group:
@@ -217,27 +236,13 @@ async def get_azure_costs(
         if service_name:
             query = query.where(AzureCostData.service_name == service_name)
         
+        query = query.order_by(AzureCostData.date, AzureCostData.id).limit(limit).offset(offset)
         result = await db.execute(query)
-        costs = result.scalars().all()
         
-        return [
-            {
-                "id": cost.id,
-                "subscription_id": cost.subscription_id,
-                "resource_group": cost.resource_group,
-                "resource_name": cost.resource_name,
-                "resource_type": cost.resource_type,
-                "service_name": cost.service_name,
-                "cost": cost.cost,
-                "currency": cost.currency,
-                "date": cost.date,
-                "tags": cost.tags
-            }
-            for cost in costs
-        ]
+        return ORJSONResponse([dict(row) for row in result.mappings()])
         
     except Exception as e:
-        logger.error(f"Error getting Azure costs: {str(e)}")
+        logger.exception("Error getting Azure costs", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get Azure costs")
 
 
@@ -246,49 +251,46 @@ async def get_kubernetes_metrics(
     namespace: Optional[str] = Query(None),
     cluster_name: Optional[str] = Query("default"),
     hours_back: int = Query(24, ge=1, le=168),
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get Kubernetes resource metrics
     """
     try:
-        period_start = datetime.utcnow() - timedelta(hours=hours_back)
-        period_end = datetime.utcnow()
+        period_end = utcnow()
+        period_start = period_end - timedelta(hours=hours_back)
         
-        query = select(KubernetesMetrics).where(
-            and_(
-                KubernetesMetrics.timestamp >= period_start,
-                KubernetesMetrics.timestamp <= period_end,
-                KubernetesMetrics.cluster_name == cluster_name
-            )
+        query = select(
+            KubernetesMetrics.id,
+            KubernetesMetrics.namespace,
+            KubernetesMetrics.pod_name,
+            KubernetesMetrics.deployment_name,
+            KubernetesMetrics.cpu_requests,
+            KubernetesMetrics.cpu_limits,
+            KubernetesMetrics.cpu_usage,
+            KubernetesMetrics.memory_requests,
+            KubernetesMetrics.memory_limits,
+            KubernetesMetrics.memory_usage,
+            KubernetesMetrics.storage_requests,
+            KubernetesMetrics.storage_usage,
+            KubernetesMetrics.timestamp,
+            KubernetesMetrics.labels
+        ).where(
+            KubernetesMetrics.timestamp >= period_start,
+            KubernetesMetrics.timestamp <= period_end,
+            KubernetesMetrics.cluster_name == cluster_name
         )
         
         if namespace:
             query = query.where(KubernetesMetrics.namespace == namespace)
         
+        query = query.order_by(KubernetesMetrics.timestamp, KubernetesMetrics.id).limit(limit).offset(offset)
         result = await db.execute(query)
-        metrics = result.scalars().all()
         
-        return [
-            {
-                "id": metric.id,
-                "namespace": metric.namespace,
-                "pod_name": metric.pod_name,
-                "deployment_name": metric.deployment_name,
-                "cpu_requests": metric.cpu_requests,
-                "cpu_limits": metric.cpu_limits,
-                "cpu_usage": metric.cpu_usage,
-                "memory_requests": metric.memory_requests,
-                "memory_limits": metric.memory_limits,
-                "memory_usage": metric.memory_usage,
-                "storage_requests": metric.storage_requests,
-                "storage_usage": metric.storage_usage,
-                "timestamp": metric.timestamp,
-                "labels": metric.labels
-            }
-            for metric in metrics
-        ]
+        return ORJSONResponse([dict(row) for row in result.mappings()])
         
     except Exception as e:
-        logger.error(f"Error getting Kubernetes metrics: {str(e)}")
+        logger.exception("Error getting Kubernetes metrics", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get Kubernetes metrics")
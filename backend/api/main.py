@@ -1,12 +1,18 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
+import os
+import time
+import orjson
 import structlog
 
 from core.database import get_db
 from core.config import settings
+from core.logging_config import configure_logging
 from models.schemas import (
     CostOverviewResponse, NamespaceCostResponse, CostTrendResponse,
     OptimizationRecommendation, CostComparison
@@ -15,24 +21,51 @@ from api.cost_routes import router as cost_router
 from api.recommendations_routes import router as recommendations_router
 from api.analytics_routes import router as analytics_router
 
+configure_logging(settings.log_level)
 logger = structlog.get_logger()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup and shutdown
+    """
+    logger.info("Starting application", app=settings.app_name, version=settings.app_version)
+    
+    # Schema is normally managed at deploy time; only create tables when asked to
+    if settings.create_tables_on_startup:
+        from core.database import engine
+        from models.cost_models import Base
+        
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        
+        logger.info("Database tables initialized")
+    
+    yield
+    
+    logger.info("Shutting down application", app=settings.app_name)
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="Open-source FinOps platform for Kubernetes and Azure cost management",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure appropriately for production
+    allow_origins=settings.backend_cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
 # Include routers
@@ -41,53 +74,48 @@ app.include_router(recommendations_router, prefix=settings.api_v1_prefix)
 app.include_router(analytics_router, prefix=settings.api_v1_prefix)
 
 
+_root_body = orjson.dumps({
+    "message": "CloudCostGuard API",
+    "version": settings.app_version,
+    "docs": "/docs"
+})
+
+
 @app.get("/")
 async def root():
     """
     Root endpoint
     """
-    return {
-        "message": "CloudCostGuard API",
-        "version": settings.app_version,
-        "docs": "/docs"
-    }
+    return Response(content=_root_body, media_type="application/json")
 
 
-@app.get("/health")
-async def health_check():
-    """
-    Health check endpoint
-    """
-    return {
-        "status": "healthy",
-        "timestamp": datetime.utcnow(),
-        "version": settings.app_version
-    }
+_health_body = b""
+_health_second = None
 
 
-@app.on_event("startup")
-async def startup_event():
+def _health_response_body() -> bytes:
     """
-    Application startup event
+    Health payload, re-encoded at most once per second
     """
-    logger.info(f"Starting {settings.app_name} v{settings.app_version}")
+    global _health_body, _health_second
     
-    # Initialize database tables
-    from core.database import engine
-    from models.cost_models import Base
-    
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    
-    logger.info("Database tables initialized")
+    second = int(time.time())
+    if second != _health_second:
+        _health_body = orjson.dumps({
+            "status": "healthy",
+            "timestamp": datetime.fromtimestamp(second, timezone.utc).replace(tzinfo=None),
+            "version": settings.app_version
+        })
+        _health_second = second
+    return _health_body
 
 
-@app.on_event("shutdown")
-async def shutdown_event():
+@app.api_route("/health", methods=["GET", "HEAD"], include_in_schema=False)
+async def health_check():
     """
-    Application shutdown event
+    Health check endpoint
     """
-    logger.info(f"Shutting down {settings.app_name}")
+    return Response(content=_health_response_body(), media_type="application/json")
 
 
 if __name__ == "__main__":
@@ -96,6 +124,10 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=1 if settings.debug else (os.cpu_count() or 1) * 2 + 1,
         reload=settings.debug,
-        log_level="info"
+        log_level="info",
+        access_log=False
     )
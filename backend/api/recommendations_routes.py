@@ -1,32 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, update
-from datetime import datetime
+from sqlalchemy import select, update, func, case, tuple_
 from typing import List, Optional
 import structlog
 
 from core.database import get_db
+from core.cache import cached
+from core.periods import utcnow
 from models.cost_models import OptimizationRecommendation
-from models.schemas import OptimizationRecommendation, StatusEnum, PriorityEnum
+from models.schemas import OptimizationRecommendation as OptimizationRecommendationSchema, StatusEnum, PriorityEnum
+from recommendations.recommendation_engine import RecommendationEngine
 
 logger = structlog.get_logger()
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
 
-@router.get("/", response_model=List[OptimizationRecommendation])
+@router.get("/", response_model=List[OptimizationRecommendationSchema])
 async def get_recommendations(
     namespace: Optional[str] = Query(None),
     cluster_name: Optional[str] = Query("default"),
     status: Optional[StatusEnum] = Query(None),
     priority: Optional[PriorityEnum] = Query(None),
     limit: int = Query(50, ge=1, le=100),
+    after_priority: Optional[int] = Query(None, ge=0, le=2),
+    after_savings: Optional[float] = Query(None),
+    after_id: Optional[int] = Query(None),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get optimization recommendations with filtering
+    Get optimization recommendations with filtering, paged by the last
+    row's (priority_rank, potential_savings, id)
     """
     try:
-        query = select(OptimizationRecommendation).where(
+        cursor = (after_priority, after_savings, after_id)
+        if any(value is not None for value in cursor) and None in cursor:
+            raise HTTPException(
+                status_code=400,
+                detail="after_priority, after_savings and after_id must be given together"
+            )
+        
+        query = select(OptimizationRecommendation.__table__).where(
             OptimizationRecommendation.cluster_name == cluster_name
         )
         
@@ -39,22 +52,36 @@ async def get_recommendations(
         if priority:
             query = query.where(OptimizationRecommendation.priority == priority)
         
+        order_key = tuple_(
+            OptimizationRecommendation.priority_rank,
+            OptimizationRecommendation.potential_savings,
+            OptimizationRecommendation.id
+        )
+        if after_id is not None:
+            query = query.where(order_key < tuple_(after_priority, after_savings, after_id))
+        
         query = query.order_by(
-            OptimizationRecommendation.priority.desc(),
-            OptimizationRecommendation.potential_savings.desc()
+            OptimizationRecommendation.priority_rank.desc(),
+            OptimizationRecommendation.potential_savings.desc(),
+            OptimizationRecommendation.id.desc()
         ).limit(limit)
         
         result = await db.execute(query)
-        recommendations = result.scalars().all()
         
-        return recommendations
+        # Rows come straight from our own table, so skip re-validating each model
+        return [
+            OptimizationRecommendationSchema.model_construct(**recommendation)
+            for recommendation in result.mappings()
+        ]
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error getting recommendations: {str(e)}")
+        logger.exception("Error getting recommendations", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get recommendations")
 
 
-@router.get("/{recommendation_id}", response_model=OptimizationRecommendation)
+@router.get("/{recommendation_id}", response_model=OptimizationRecommendationSchema)
 async def get_recommendation(
     recommendation_id: int,
     db: AsyncSession = Depends(get_db)
@@ -63,21 +90,21 @@ async def get_recommendation(
     Get a specific recommendation by ID
     """
     try:
-        query = select(OptimizationRecommendation).where(
+        query = select(OptimizationRecommendation.__table__).where(
             OptimizationRecommendation.id == recommendation_id
         )
         result = await db.execute(query)
-        recommendation = result.scalar_one_or_none()
+        recommendation = result.mappings().one_or_none()
         
         if not recommendation:
             raise HTTPException(status_code=404, detail="Recommendation not found")
         
-        return recommendation
+        return OptimizationRecommendationSchema.model_construct(**recommendation)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting recommendation {recommendation_id}: {str(e)}")
+        logger.exception("Error getting recommendation", recommendation_id=recommendation_id, error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get recommendation")
 
 
@@ -91,27 +118,22 @@ async def update_recommendation_status(
     Update recommendation status
     """
     try:
-        # Check if recommendation exists
-        get_query = select(OptimizationRecommendation).where(
-            OptimizationRecommendation.id == recommendation_id
-        )
-        result = await db.execute(get_query)
-        recommendation = result.scalar_one_or_none()
-        
-        if not recommendation:
-            raise HTTPException(status_code=404, detail="Recommendation not found")
-        
-        # Update status
         update_data = {"status": status}
         if status == StatusEnum.IMPLEMENTED:
-            update_data["implemented_at"] = datetime.utcnow()
+            update_data["implemented_at"] = utcnow()
         
+        # Update and check existence in one round trip
         update_query = update(OptimizationRecommendation).where(
             OptimizationRecommendation.id == recommendation_id
-        ).values(**update_data)
+        ).values(**update_data).returning(OptimizationRecommendation.id)
+        
+        result = await db.execute(update_query)
+        if result.first() is None:
+            raise HTTPException(status_code=404, detail="Recommendation not found")
         
-        await db.execute(update_query)
         await db.commit()
+        # Only this worker's copy; others catch up within the summary TTL
+        get_recommendations_summary.cache.clear()
         
         return {"message": f"Recommendation status updated to {status}"}
         
@@ -119,11 +141,14 @@ async def update_recommendation_status(
         raise
     except Exception as e:
         await db.rollback()
-        logger.error(f"Error updating recommendation status: {str(e)}")
+        logger.exception("Error updating recommendation status", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to update recommendation status")
 
 
 @router.get("/summary/overview")
+# The cache is per process: clearing it after a write only reaches the worker that made the
+# write, so other API workers and scheduled Celery generation may serve a summary up to 30s stale
+@cached(ttl=30, max_age=0)
 async def get_recommendations_summary(
     namespace: Optional[str] = Query(None),
     cluster_name: Optional[str] = Query("default"),
@@ -133,38 +158,45 @@ async def get_recommendations_summary(
     Get recommendations summary overview
     """
     try:
-        base_query = select(OptimizationRecommendation).where(
-            OptimizationRecommendation.cluster_name == cluster_name
-        )
-        
+        filters = [OptimizationRecommendation.cluster_name == cluster_name]
         if namespace:
-            base_query = base_query.where(OptimizationRecommendation.namespace == namespace)
-        
-        # Get all recommendations
-        result = await db.execute(base_query)
-        all_recommendations = result.scalars().all()
-        
-        # Calculate summary statistics
-        total_recommendations = len(all_recommendations)
-        pending_recommendations = len([r for r in all_recommendations if r.status == StatusEnum.PENDING])
-        implemented_recommendations = len([r for r in all_recommendations if r.status == StatusEnum.IMPLEMENTED])
-        dismissed_recommendations = len([r for r in all_recommendations if r.status == StatusEnum.DISMISSED])
-        
-        # Calculate potential savings
-        total_potential_savings = sum(r.potential_savings for r in all_recommendations if r.status == StatusEnum.PENDING)
-        implemented_savings = sum(r.potential_savings for r in all_recommendations if r.status == StatusEnum.IMPLEMENTED)
-        
-        # Group by priority
-        high_priority = len([r for r in all_recommendations if r.priority == PriorityEnum.HIGH and r.status == StatusEnum.PENDING])
-        medium_priority = len([r for r in all_recommendations if r.priority == PriorityEnum.MEDIUM and r.status == StatusEnum.PENDING])
-        low_priority = len([r for r in all_recommendations if r.priority == PriorityEnum.LOW and r.status == StatusEnum.PENDING])
+            filters.append(OptimizationRecommendation.namespace == namespace)
+        
+        status = OptimizationRecommendation.status
+        savings = OptimizationRecommendation.potential_savings
+        
+        # Status counts and savings in a single aggregate row
+        totals_query = select(
+            func.count(),
+            func.sum(case((status == StatusEnum.PENDING, 1), else_=0)),
+            func.sum(case((status == StatusEnum.IMPLEMENTED, 1), else_=0)),
+            func.sum(case((status == StatusEnum.DISMISSED, 1), else_=0)),
+            func.sum(case((status == StatusEnum.PENDING, savings), else_=0)),
+            func.sum(case((status == StatusEnum.IMPLEMENTED, savings), else_=0))
+        ).where(*filters)
+        result = await db.execute(totals_query)
+        (
+            total_recommendations,
+            pending_recommendations,
+            implemented_recommendations,
+            dismissed_recommendations,
+            total_potential_savings,
+            implemented_savings
+        ) = (value or 0 for value in result.one())
+        
+        # Pending recommendations by priority
+        priority_query = select(
+            OptimizationRecommendation.priority, func.count()
+        ).where(*filters, status == StatusEnum.PENDING).group_by(OptimizationRecommendation.priority)
+        result = await db.execute(priority_query)
+        priority_counts = dict(result.all())
         
         # Group by recommendation type
-        type_counts = {}
-        for rec in all_recommendations:
-            if rec.recommendation_type not in type_counts:
-                type_counts[rec.recommendation_type] = 0
-            type_counts[rec.recommendation_type] += 1
+        type_query = select(
+            OptimizationRecommendation.recommendation_type, func.count()
+        ).where(*filters).group_by(OptimizationRecommendation.recommendation_type)
+        result = await db.execute(type_query)
+        type_counts = dict(result.all())
         
         return {
             "total_recommendations": total_recommendations,
@@ -174,43 +206,44 @@ async def get_recommendations_summary(
             "total_potential_savings": total_potential_savings,
             "implemented_savings": implemented_savings,
             "priority_breakdown": {
-                "high": high_priority,
-                "medium": medium_priority,
-                "low": low_priority
+                "high": priority_counts.get(PriorityEnum.HIGH.value, 0),
+                "medium": priority_counts.get(PriorityEnum.MEDIUM.value, 0),
+                "low": priority_counts.get(PriorityEnum.LOW.value, 0)
             },
             "type_breakdown": type_counts
         }
         
     except Exception as e:
-        logger.error(f"Error getting recommendations summary: {str(e)}")
+        logger.exception("Error getting recommendations summary", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get recommendations summary")
 
 
-@router.post("/generate")
+async def _generate_recommendations(cluster_name: str, days_back: int):
+    """
+    Run recommendation generation, then drop this worker's cached summaries
+    """
+    try:
+        # A user asking for generation wants current data, not this hour's cached run
+        await RecommendationEngine().run_recommendation_generation(cluster_name, days_back, use_cache=False)
+    except Exception as e:
+        # Nobody awaits this task, so leave a trace of the failed manual run here
+        logger.warning("Manual recommendation generation failed", cluster=cluster_name, error=str(e))
+    finally:
+        get_recommendations_summary.cache.clear()
+
+
+@router.post("/generate", status_code=202)
 async def trigger_recommendation_generation(
+    background_tasks: BackgroundTasks,
     cluster_name: str = Query("default"),
     days_back: int = Query(7, ge=1, le=30)
 ):
     """
-    Trigger manual recommendation generation
+    Trigger manual recommendation generation in the background
     """
-    try:
-        from recommendations.recommendation_engine import schedule_recommendation_generation
-        import asyncio
-        
-        # Run recommendation generation
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        recommendations = loop.run_until_complete(
-            schedule_recommendation_generation(cluster_name)
-        )
-        
-        return {
-            "message": "Recommendation generation completed",
-            "generated_count": len(recommendations)
-        }
-        
-    except Exception as e:
-        logger.error(f"Error triggering recommendation generation: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to generate recommendations")
+    background_tasks.add_task(_generate_recommendations, cluster_name, days_back)
+    
+    return {
+        "message": "Recommendation generation scheduled",
+        "cluster_name": cluster_name
+    }
@@ -0,0 +1,84 @@
+import functools
+import inspect
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from fastapi import Response
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    In-process cache whose entries expire a fixed number of seconds after being set
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if key not in self._data and len(self._data) >= self.maxsize:
+            self._evict()
+        self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+
+        # Still full: drop the oldest insertions
+        while len(self._data) >= self.maxsize:
+            del self._data[next(iter(self._data))]
+
+
+def cached(ttl: float, exclude: Iterable[str] = ("db",), max_age: Optional[float] = None) -> Callable:
+    """
+    Cache an async route handler's result per query parameters for `ttl` seconds
+    and advertise `max_age` (default: the same lifetime) to clients via Cache-Control
+    """
+    excluded = frozenset(exclude)
+    if max_age is None:
+        max_age = ttl
+
+    def decorator(handler: Callable) -> Callable:
+        cache = TTLCache(ttl)
+        signature = inspect.signature(handler)
+
+        @functools.wraps(handler)
+        async def wrapper(*args, response: Response, **kwargs):
+            key = tuple(sorted((name, value) for name, value in kwargs.items() if name not in excluded))
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = await handler(*args, **kwargs)
+                cache.set(key, value)
+
+            response.headers["Cache-Control"] = f"public, max-age={int(max_age)}"
+            return value
+
+        # Let FastAPI inject the Response alongside the handler's own parameters
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("response", inspect.Parameter.KEYWORD_ONLY, annotation=Response)
+        ])
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
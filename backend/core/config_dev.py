@@ -1,13 +1,15 @@
 """Development configuration for CloudCostGuard"""
 
+from functools import lru_cache
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
     # Application settings
     app_name: str = "CloudCostGuard"
     debug: bool = True
+    log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "DEBUG"
     version: str = "1.0.0"
     
     # Database settings (SQLite for development)
@@ -50,5 +52,13 @@ class Settings(BaseSettings):
         case_sensitive = False
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Settings parsed from the environment once per process
+    """
+    return Settings()
+
+
 # Create a global settings instance
-settings = Settings()
+settings = get_settings()
@@ -1,17 +1,40 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from contextlib import asynccontextmanager
+from typing import Optional
+from sqlalchemy import String, func, literal_column
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from .config import settings
 
+engine_options = {}
+if make_url(settings.database_url).get_backend_name() == "postgresql":
+    # Size the pool for dashboard polling and keep asyncpg's prepared statements warm
+    engine_options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "connect_args": {
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "server_settings": {
+                "jit": "off",
+                # Probe idle pooled connections so dead sockets are noticed early
+                "tcp_keepalives_idle": str(settings.db_tcp_keepalives_idle)
+            }
+        }
+    }
+
 engine = create_async_engine(
     settings.database_url,
     echo=settings.debug,
-    future=True
+    future=True,
+    **engine_options
 )
 
-AsyncSessionLocal = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
-)
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -22,3 +45,34 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+
+@asynccontextmanager
+async def session_scope(db: Optional[AsyncSession] = None):
+    """
+    Reuse the caller's session, or open a new one for the duration of the block
+    """
+    if db is not None:
+        yield db
+    else:
+        async with AsyncSessionLocal() as session:
+            yield session
+
+
+class month_bucket(FunctionElement):
+    """
+    'YYYY-MM' label of a timestamp column, rendered for the active dialect
+    """
+    type = String()
+    name = "month_bucket"
+    inherit_cache = True
+
+
+@compiles(month_bucket)
+def _compile_month_bucket(element, compiler, **kw):
+    return compiler.process(func.to_char(*element.clauses, literal_column("'YYYY-MM'")), **kw)
+
+
+@compiles(month_bucket, "sqlite")
+def _compile_month_bucket_sqlite(element, compiler, **kw):
+    return compiler.process(func.strftime(literal_column("'%Y-%m'"), *element.clauses), **kw)
@@ -0,0 +1,11 @@
+import structlog
+
+
+def configure_logging(level: str = "INFO"):
+    """
+    Drop log calls below `level` before any event processing or rendering happens
+    """
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(level),
+        cache_logger_on_first_use=True
+    )
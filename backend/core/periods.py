@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Tuple
+from dateutil.relativedelta import relativedelta
+
+
+def utcnow() -> datetime:
+    """
+    Current UTC time as a naive datetime, matching the timestamp columns
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def month_start(value: datetime) -> datetime:
+    """
+    Truncate a datetime to midnight on the first day of its month
+    """
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """
+    Shift a datetime by whole calendar months
+    """
+    return value + relativedelta(months=months)
+
+
+@lru_cache(maxsize=64)
+def month_starts(period_end: datetime, months: int) -> Tuple[datetime, ...]:
+    """
+    Start of each of the `months` calendar months before period_end, oldest first
+    """
+    period_end = month_start(period_end)
+    return tuple(add_months(period_end, -i) for i in range(months, 0, -1))
@@ -1,17 +1,22 @@
 import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
+from urllib.parse import parse_qs, urlparse
 from azure.identity import DefaultAzureCredential
 from azure.mgmt.costmanagement import CostManagementClient
 from azure.mgmt.costmanagement.models import QueryDefinition, QueryTimeframe, QueryType, QueryAggregation, QueryGrouping
 from sqlalchemy.ext.asyncio import AsyncSession
-from core.database import get_db
+from sqlalchemy import insert
+from core.database import AsyncSessionLocal
+from core.periods import utcnow
 from models.cost_models import AzureCostData
 from models.schemas import AzureCostDataCreate
 import structlog
 
 logger = structlog.get_logger()
 
+COST_CHUNK_SIZE = 500
+
 
 class AzureCostCollector:
     def __init__(self, subscription_id: str):
@@ -23,10 +28,11 @@ class AzureCostCollector:
         self, 
         start_date: datetime, 
         end_date: datetime,
-        resource_group: str = None
-    ) -> List[Dict[str, Any]]:
+        resource_group: str = None,
+        chunk_size: int = COST_CHUNK_SIZE
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
         """
-        Collect cost data from Azure Cost Management API
+        Collect cost data from Azure Cost Management API, yielding rows in chunks
         """
         try:
             query_definition = QueryDefinition(
@@ -54,26 +60,41 @@ class AzureCostCollector:
             if resource_group:
                 scope = f"/subscriptions/{self.subscription_id}/resourceGroups/{resource_group}"
             
-            result = self.client.query.usage(scope, query_definition)
-            
-            cost_data = []
-            if result.rows:
-                for row in result.rows:
-                    cost_data.append({
-                        "date": row[0],
-                        "resource_group": row[1],
-                        "resource_type": row[2],
-                        "service_name": row[3],
-                        "location": row[4],
-                        "currency": row[5],
-                        "cost": row[6]
-                    })
+            # The query API returns one page at a time; later pages are requested by passing the
+            # $skiptoken from next_link back to the same endpoint. The SDK client is blocking, so
+            # each page is fetched in a thread and its rows are handed on before asking for the next
+            page_params = {}
+            count = 0
+            while True:
+                result = await asyncio.to_thread(
+                    self.client.query.usage, scope, query_definition, params=page_params
+                )
+                
+                rows = result.rows or []
+                for offset in range(0, len(rows), chunk_size):
+                    yield [
+                        {
+                            "date": row[0],
+                            "resource_group": row[1],
+                            "resource_type": row[2],
+                            "service_name": row[3],
+                            "location": row[4],
+                            "currency": row[5],
+                            "cost": row[6]
+                        }
+                        for row in rows[offset:offset + chunk_size]
+                    ]
+                count += len(rows)
+                
+                skiptoken = parse_qs(urlparse(result.next_link or "").query).get("$skiptoken")
+                if not skiptoken:
+                    break
+                page_params = {"$skiptoken": skiptoken[0]}
             
-            logger.info(f"Collected {len(cost_data)} cost records from Azure")
-            return cost_data
+            logger.info("Collected cost records from Azure", count=count)
             
         except Exception as e:
-            logger.error(f"Error collecting Azure cost data: {str(e)}")
+            logger.exception("Error collecting Azure cost data", error=str(e))
             raise
     
     async def get_resource_details(self, resource_group: str, resource_name: str) -> Dict[str, Any]:
@@ -89,23 +110,26 @@ class AzureCostCollector:
                 "tags": {}
             }
         except Exception as e:
-            logger.error(f"Error getting resource details: {str(e)}")
+            logger.exception("Error getting resource details", error=str(e))
             return {}
     
     async def store_cost_data(self, db: AsyncSession, cost_data: List[Dict[str, Any]]):
         """
-        Store collected cost data in the database
+        Store collected cost data within the caller's transaction
         """
         try:
-            stored_count = 0
+            # Look up resource details for tags once per distinct resource, concurrently
+            resource_keys = list({(data["resource_group"], data.get("resource_name", "")) for data in cost_data})
+            details_list = await asyncio.gather(
+                *(self.get_resource_details(resource_group, resource_name) for resource_group, resource_name in resource_keys)
+            )
+            resource_details_by_key = dict(zip(resource_keys, details_list))
+            
+            rows = []
             for data in cost_data:
-                # Get resource details for tags
-                resource_details = await self.get_resource_details(
-                    data["resource_group"], 
-                    data.get("resource_name", "")
-                )
+                resource_details = resource_details_by_key[(data["resource_group"], data.get("resource_name", ""))]
                 
-                cost_record = AzureCostDataCreate(
+                rows.append(AzureCostDataCreate(
                     subscription_id=self.subscription_id,
                     resource_group=data["resource_group"],
                     resource_name=data.get("resource_name", ""),
@@ -116,41 +140,36 @@ class AzureCostCollector:
                     date=data["date"],
                     billing_period=f"{data['date'].year}-{data['date'].month:02d}",
                     tags=resource_details.get("tags", {})
-                )
-                
-                db_cost = AzureCostData(**cost_record.dict())
-                db.add(db_cost)
-                stored_count += 1
+                ).dict())
+            
+            if rows:
+                await db.execute(insert(AzureCostData), rows)
             
-            await db.commit()
-            logger.info(f"Stored {stored_count} cost records in database")
+            logger.info("Stored cost records in database", count=len(rows))
             
         except Exception as e:
-            await db.rollback()
-            logger.error(f"Error storing cost data: {str(e)}")
+            logger.exception("Error storing cost data", error=str(e))
             raise
     
     async def run_collection(self, days_back: int = 30):
         """
         Run the complete collection process
         """
-        end_date = datetime.utcnow()
+        end_date = utcnow()
         start_date = end_date - timedelta(days=days_back)
         
-        logger.info(f"Starting Azure cost collection for period {start_date} to {end_date}")
+        logger.info("Starting Azure cost collection", start_date=start_date, end_date=end_date)
         
         try:
-            # Collect cost data
-            cost_data = await self.collect_cost_data(start_date, end_date)
-            
-            # Store in database
-            async for db in get_db():
-                await self.store_cost_data(db, cost_data)
+            # Store each chunk of cost data as it is collected, committing once at the end
+            async with AsyncSessionLocal() as db, db.begin():
+                async for cost_data in self.collect_cost_data(start_date, end_date):
+                    await self.store_cost_data(db, cost_data)
             
             logger.info("Azure cost collection completed successfully")
             
         except Exception as e:
-            logger.error(f"Azure cost collection failed: {str(e)}")
+            logger.exception("Azure cost collection failed", error=str(e))
             raise
 
 
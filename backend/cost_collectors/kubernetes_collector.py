@@ -1,40 +1,116 @@
 import asyncio
 import aiohttp
+import orjson
+from contextlib import nullcontext
+from functools import lru_cache
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert
 from prometheus_client import parser
-from core.database import get_db
+from core.database import AsyncSessionLocal
+from core.periods import utcnow
 from models.cost_models import KubernetesMetrics
 from models.schemas import KubernetesMetricsCreate
 import structlog
 
 logger = structlog.get_logger()
 
+EMPTY_USAGE = {
+    'cpu_requests': 0.0,
+    'cpu_limits': 0.0,
+    'cpu_usage': 0.0,
+    'memory_requests': 0.0,
+    'memory_limits': 0.0,
+    'memory_usage': 0.0,
+    'storage_requests': 0.0,
+    'storage_usage': 0.0
+}
+STORAGE_METRICS = frozenset({'storage_requests', 'storage_usage'})
+PROMETHEUS_QUERY_TEMPLATES = {
+    'cpu_requests': 'sum(kube_pod_container_resource_requests{{resource="cpu", {namespace_filter}}}) by (namespace, pod)',
+    'cpu_limits': 'sum(kube_pod_container_resource_limits{{resource="cpu", {namespace_filter}}}) by (namespace, pod)',
+    'cpu_usage': 'sum(rate(container_cpu_usage_seconds_total{{container!="POD", {namespace_filter}}}[5m])) by (namespace, pod)',
+    'memory_requests': 'sum(kube_pod_container_resource_requests{{resource="memory", {namespace_filter}}}) by (namespace, pod)',
+    'memory_limits': 'sum(kube_pod_container_resource_limits{{resource="memory", {namespace_filter}}}) by (namespace, pod)',
+    'memory_usage': 'sum(container_memory_working_set_bytes{{container!="POD", {namespace_filter}}}) by (namespace, pod)',
+    'storage_requests': 'sum(kube_persistentvolumeclaim_resource_requests_storage_bytes{{{namespace_filter}}}) by (namespace, persistentvolumeclaim)',
+    'storage_usage': 'sum(kubelet_volume_stats_used_bytes{{{namespace_filter}}}) by (namespace, persistentvolumeclaim)'
+}
+
+
+@lru_cache(maxsize=128)
+def namespace_queries(namespace: Optional[str] = None) -> Dict[str, str]:
+    """
+    PromQL for each metric, filtered to a namespace when one is given
+    """
+    namespace_filter = f'namespace="{namespace}"' if namespace else ""
+    return {
+        metric_name: template.format(namespace_filter=namespace_filter)
+        for metric_name, template in PROMETHEUS_QUERY_TEMPLATES.items()
+    }
+
+
+def new_prometheus_session() -> aiohttp.ClientSession:
+    """
+    HTTP session with a keep-alive connection pool sized for the metric queries
+    """
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+        limit=32,
+        limit_per_host=32,
+        ttl_dns_cache=300,
+        keepalive_timeout=60
+    ))
+
 
 class KubernetesMetricsCollector:
-    def __init__(self, prometheus_url: str):
+    def __init__(self, prometheus_url: str, session: Optional[aiohttp.ClientSession] = None):
         self.prometheus_url = prometheus_url.rstrip('/')
+        # A session passed in belongs to the caller, which keeps it open across collections
+        self._shared_session = session
+        self._session: Optional[aiohttp.ClientSession] = session
+    
+    async def __aenter__(self) -> "KubernetesMetricsCollector":
+        if self._shared_session is None:
+            self._session = new_prometheus_session()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        if self._shared_session is None:
+            session, self._session = self._session, None
+            await session.close()
+    
+    def _session_context(self, session: Optional[aiohttp.ClientSession] = None):
+        """
+        Use the given or collector-wide session, or a one-off session outside `async with`
+        """
+        session = session or self._session
+        return nullcontext(session) if session is not None else new_prometheus_session()
     
-    async def query_prometheus(self, query: str, time: Optional[datetime] = None) -> Dict[str, Any]:
+    async def query_prometheus(
+        self,
+        query: str,
+        time: Optional[datetime] = None,
+        session: Optional[aiohttp.ClientSession] = None
+    ) -> Dict[str, Any]:
         """
-        Query Prometheus API
+        Query Prometheus API, on the given session if one is passed
         """
         try:
             params = {'query': query}
             if time:
                 params['time'] = time.timestamp()
             
-            async with aiohttp.ClientSession() as session:
+            async with self._session_context(session) as session:
                 url = f"{self.prometheus_url}/api/v1/query"
                 async with session.get(url, params=params) as response:
                     if response.status == 200:
-                        return await response.json()
+                        return orjson.loads(await response.read())
                     else:
                         raise Exception(f"Prometheus query failed: {response.status}")
         
         except Exception as e:
-            logger.error(f"Error querying Prometheus: {str(e)}")
+            logger.exception("Error querying Prometheus", error=str(e))
             raise
     
     async def query_prometheus_range(self, query: str, start: datetime, end: datetime, step: str = "1h") -> Dict[str, Any]:
@@ -49,16 +125,16 @@ class KubernetesMetricsCollector:
                 'step': step
             }
             
-            async with aiohttp.ClientSession() as session:
+            async with self._session_context() as session:
                 url = f"{self.prometheus_url}/api/v1/query_range"
                 async with session.get(url, params=params) as response:
                     if response.status == 200:
-                        return await response.json()
+                        return orjson.loads(await response.read())
                     else:
                         raise Exception(f"Prometheus range query failed: {response.status}")
         
         except Exception as e:
-            logger.error(f"Error querying Prometheus range: {str(e)}")
+            logger.exception("Error querying Prometheus range", error=str(e))
             raise
     
     async def get_namespace_metrics(self, namespace: str = None) -> List[Dict[str, Any]]:
@@ -66,97 +142,57 @@ class KubernetesMetricsCollector:
         Get Kubernetes metrics by namespace
         """
         try:
-            namespace_filter = f'namespace="{namespace}"' if namespace else ""
+            queries = namespace_queries(namespace)
             
-            queries = {
-                'cpu_requests': f'sum(kube_pod_container_resource_requests{{resource="cpu", {namespace_filter}}}) by (namespace, pod)',
-                'cpu_limits': f'sum(kube_pod_container_resource_limits{{resource="cpu", {namespace_filter}}}) by (namespace, pod)',
-                'cpu_usage': f'sum(rate(container_cpu_usage_seconds_total{{container!="POD", {namespace_filter}}}[5m])) by (namespace, pod)',
-                'memory_requests': f'sum(kube_pod_container_resource_requests{{resource="memory", {namespace_filter}}}) by (namespace, pod)',
-                'memory_limits': f'sum(kube_pod_container_resource_limits{{resource="memory", {namespace_filter}}}) by (namespace, pod)',
-                'memory_usage': f'sum(container_memory_working_set_bytes{{container!="POD", {namespace_filter}}}) by (namespace, pod)',
-                'storage_requests': f'sum(kube_persistentvolumeclaim_resource_requests_storage_bytes{{{namespace_filter}}}) by (namespace, persistentvolumeclaim)',
-                'storage_usage': f'sum(kubelet_volume_stats_used_bytes{{{namespace_filter}}}) by (namespace, persistentvolumeclaim)'
-            }
+            # Issue all queries at once over one connection pool
+            async with self._session_context() as session:
+                results = await asyncio.gather(
+                    *(self.query_prometheus(query, session=session) for query in queries.values()),
+                    return_exceptions=True
+                )
             
             metrics = {}
-            for metric_name, query in queries.items():
-                try:
-                    result = await self.query_prometheus(query)
-                    if result['status'] == 'success' and result['data']['result']:
-                        metrics[metric_name] = result['data']['result']
-                    else:
-                        metrics[metric_name] = []
-                except Exception as e:
-                    logger.warning(f"Failed to get {metric_name}: {str(e)}")
+            for metric_name, result in zip(queries.keys(), results):
+                if isinstance(result, Exception):
+                    logger.warning("Failed to get metric", metric=metric_name, error=str(result))
+                    metrics[metric_name] = []
+                elif result['status'] == 'success' and result['data']['result']:
+                    metrics[metric_name] = result['data']['result']
+                else:
                     metrics[metric_name] = []
             
-            # Combine metrics into unified format
-            combined_metrics = []
+            # Combine metrics into one record per pod, plus one storage record per namespace
             namespace_data = {}
-            
-            # Process CPU and memory metrics
-            for metric_type, data in metrics.items():
-                if metric_type in ['cpu_requests', 'cpu_limits', 'cpu_usage', 
-                                 'memory_requests', 'memory_limits', 'memory_usage']:
-                    for item in data:
-                        namespace = item['metric'].get('namespace', 'unknown')
-                        pod = item['metric'].get('pod', 'unknown')
-                        value = float(item['value'][1])
-                        
-                        key = f"{namespace}:{pod}"
-                        if key not in namespace_data:
-                            namespace_data[key] = {
-                                'namespace': namespace,
-                                'pod_name': pod,
-                                'deployment_name': self._extract_deployment_name(item['metric']),
-                                'cpu_requests': 0.0,
-                                'cpu_limits': 0.0,
-                                'cpu_usage': 0.0,
-                                'memory_requests': 0.0,
-                                'memory_limits': 0.0,
-                                'memory_usage': 0.0,
-                                'storage_requests': 0.0,
-                                'storage_usage': 0.0,
-                                'labels': item['metric']
-                            }
-                        
-                        namespace_data[key][metric_type] = value
-            
-            # Process storage metrics
             for metric_type, data in metrics.items():
-                if metric_type in ['storage_requests', 'storage_usage']:
-                    for item in data:
-                        namespace = item['metric'].get('namespace', 'unknown')
-                        pvc = item['metric'].get('persistentvolumeclaim', 'unknown')
-                        value = float(item['value'][1])
-                        
-                        # For storage, we aggregate by namespace
-                        key = f"{namespace}:storage"
-                        if key not in namespace_data:
-                            namespace_data[key] = {
-                                'namespace': namespace,
-                                'pod_name': 'storage-aggregate',
-                                'deployment_name': '',
-                                'cpu_requests': 0.0,
-                                'cpu_limits': 0.0,
-                                'cpu_usage': 0.0,
-                                'memory_requests': 0.0,
-                                'memory_limits': 0.0,
-                                'memory_usage': 0.0,
-                                'storage_requests': 0.0,
-                                'storage_usage': 0.0,
-                                'labels': item['metric']
-                            }
-                        
-                        namespace_data[key][metric_type] += value
+                is_storage = metric_type in STORAGE_METRICS
+                for item in data:
+                    labels = item['metric']
+                    namespace = labels.get('namespace', 'unknown')
+                    pod = None if is_storage else labels.get('pod', 'unknown')
+                    value = float(item['value'][1])
+                    
+                    record = namespace_data.get((namespace, pod))
+                    if record is None:
+                        record = namespace_data[(namespace, pod)] = {
+                            'namespace': namespace,
+                            'pod_name': 'storage-aggregate' if is_storage else pod,
+                            'deployment_name': '' if is_storage else self._extract_deployment_name(labels),
+                            **EMPTY_USAGE,
+                            'labels': labels
+                        }
+                    
+                    # Storage is summed across a namespace's volume claims
+                    if is_storage:
+                        record[metric_type] += value
+                    else:
+                        record[metric_type] = value
             
             combined_metrics = list(namespace_data.values())
-            logger.info(f"Collected {len(combined_metrics)} Kubernetes metric records")
+            logger.info("Collected Kubernetes metric records", count=len(combined_metrics))
             return combined_metrics
             
         except Exception as e:
-            logger.error(f"Error collecting Kubernetes metrics: {str(e)}")
+            logger.exception("Error collecting Kubernetes metrics", error=str(e))
             raise
     
     def _extract_deployment_name(self, labels: Dict[str, Any]) -> str:
@@ -167,12 +203,13 @@ class KubernetesMetricsCollector:
     
     async def store_metrics(self, db: AsyncSession, metrics: List[Dict[str, Any]], cluster_name: str):
         """
-        Store collected metrics in the database
+        Store collected metrics within the caller's transaction
         """
         try:
-            stored_count = 0
-            for metric_data in metrics:
-                metrics_record = KubernetesMetricsCreate(
+            # One timestamp per collection cycle
+            collected_at = utcnow()
+            rows = [
+                KubernetesMetricsCreate(
                     namespace=metric_data['namespace'],
                     pod_name=metric_data['pod_name'],
                     deployment_name=metric_data['deployment_name'],
@@ -184,47 +221,51 @@ class KubernetesMetricsCollector:
                     memory_usage=metric_data['memory_usage'],
                     storage_requests=metric_data['storage_requests'],
                     storage_usage=metric_data['storage_usage'],
-                    timestamp=datetime.utcnow(),
+                    timestamp=collected_at,
                     cluster_name=cluster_name,
                     labels=metric_data['labels']
-                )
-                
-                db_metrics = KubernetesMetrics(**metrics_record.dict())
-                db.add(db_metrics)
-                stored_count += 1
+                ).dict()
+                for metric_data in metrics
+            ]
+            
+            if rows:
+                await db.execute(insert(KubernetesMetrics), rows)
             
-            await db.commit()
-            logger.info(f"Stored {stored_count} Kubernetes metric records in database")
+            logger.info("Stored Kubernetes metric records in database", count=len(rows))
             
         except Exception as e:
-            await db.rollback()
-            logger.error(f"Error storing Kubernetes metrics: {str(e)}")
+            logger.exception("Error storing Kubernetes metrics", error=str(e))
             raise
     
     async def run_collection(self, cluster_name: str = "default", namespace: str = None):
         """
         Run the complete metrics collection process
         """
-        logger.info(f"Starting Kubernetes metrics collection for cluster {cluster_name}")
+        logger.info("Starting Kubernetes metrics collection", cluster=cluster_name)
         
         try:
             # Collect metrics
-            metrics = await self.get_namespace_metrics(namespace)
+            async with self:
+                metrics = await self.get_namespace_metrics(namespace)
             
             # Store in database
-            async for db in get_db():
+            async with AsyncSessionLocal() as db, db.begin():
                 await self.store_metrics(db, metrics, cluster_name)
             
             logger.info("Kubernetes metrics collection completed successfully")
             
         except Exception as e:
-            logger.error(f"Kubernetes metrics collection failed: {str(e)}")
+            logger.exception("Kubernetes metrics collection failed", error=str(e))
             raise
 
 
-async def schedule_kubernetes_collection(prometheus_url: str, cluster_name: str = "default"):
+async def schedule_kubernetes_collection(
+    prometheus_url: str,
+    cluster_name: str = "default",
+    session: Optional[aiohttp.ClientSession] = None
+):
     """
     Scheduled task for Kubernetes metrics collection
     """
-    collector = KubernetesMetricsCollector(prometheus_url)
+    collector = KubernetesMetricsCollector(prometheus_url, session)
     await collector.run_collection(cluster_name)
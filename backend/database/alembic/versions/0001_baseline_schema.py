@@ -0,0 +1,132 @@
+"""Baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-15 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'azure_cost_data',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('subscription_id', sa.String()),
+        sa.Column('resource_group', sa.String()),
+        sa.Column('resource_name', sa.String()),
+        sa.Column('resource_type', sa.String()),
+        sa.Column('service_name', sa.String()),
+        sa.Column('cost', sa.Float()),
+        sa.Column('currency', sa.String()),
+        sa.Column('date', sa.DateTime()),
+        sa.Column('billing_period', sa.String()),
+        sa.Column('tags', sa.JSON()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_azure_cost_data_id', 'azure_cost_data', ['id'])
+    op.create_index('ix_azure_cost_data_subscription_id', 'azure_cost_data', ['subscription_id'])
+    op.create_index('ix_azure_cost_data_resource_group', 'azure_cost_data', ['resource_group'])
+    op.create_index('ix_azure_cost_data_date', 'azure_cost_data', ['date'])
+
+    op.create_table(
+        'kubernetes_metrics',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('namespace', sa.String()),
+        sa.Column('pod_name', sa.String()),
+        sa.Column('deployment_name', sa.String()),
+        sa.Column('cpu_requests', sa.Float()),
+        sa.Column('cpu_limits', sa.Float()),
+        sa.Column('cpu_usage', sa.Float()),
+        sa.Column('memory_requests', sa.Float()),
+        sa.Column('memory_limits', sa.Float()),
+        sa.Column('memory_usage', sa.Float()),
+        sa.Column('storage_requests', sa.Float()),
+        sa.Column('storage_usage', sa.Float()),
+        sa.Column('timestamp', sa.DateTime()),
+        sa.Column('cluster_name', sa.String()),
+        sa.Column('labels', sa.JSON()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_kubernetes_metrics_id', 'kubernetes_metrics', ['id'])
+    op.create_index('ix_kubernetes_metrics_namespace', 'kubernetes_metrics', ['namespace'])
+    op.create_index('ix_kubernetes_metrics_timestamp', 'kubernetes_metrics', ['timestamp'])
+
+    op.create_table(
+        'namespace_cost_allocation',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('namespace', sa.String()),
+        sa.Column('cluster_name', sa.String()),
+        sa.Column('total_cost', sa.Float()),
+        sa.Column('cpu_cost', sa.Float()),
+        sa.Column('memory_cost', sa.Float()),
+        sa.Column('storage_cost', sa.Float()),
+        sa.Column('network_cost', sa.Float()),
+        sa.Column('other_cost', sa.Float()),
+        sa.Column('period_start', sa.DateTime()),
+        sa.Column('period_end', sa.DateTime()),
+        sa.Column('allocation_method', sa.String()),
+        sa.Column('azure_cost_id', sa.Integer(), sa.ForeignKey('azure_cost_data.id')),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_namespace_cost_allocation_id', 'namespace_cost_allocation', ['id'])
+    op.create_index('ix_namespace_cost_allocation_namespace', 'namespace_cost_allocation', ['namespace'])
+    op.create_index('ix_namespace_cost_allocation_period_start', 'namespace_cost_allocation', ['period_start'])
+    op.create_index('ix_namespace_cost_allocation_period_end', 'namespace_cost_allocation', ['period_end'])
+
+    op.create_table(
+        'cost_comparison',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('namespace', sa.String()),
+        sa.Column('cluster_name', sa.String()),
+        sa.Column('current_period_cost', sa.Float()),
+        sa.Column('previous_period_cost', sa.Float()),
+        sa.Column('percentage_change', sa.Float()),
+        sa.Column('absolute_change', sa.Float()),
+        sa.Column('comparison_type', sa.String()),
+        sa.Column('current_period_start', sa.DateTime()),
+        sa.Column('current_period_end', sa.DateTime()),
+        sa.Column('previous_period_start', sa.DateTime()),
+        sa.Column('previous_period_end', sa.DateTime()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_cost_comparison_id', 'cost_comparison', ['id'])
+    op.create_index('ix_cost_comparison_namespace', 'cost_comparison', ['namespace'])
+
+    op.create_table(
+        'optimization_recommendations',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('namespace', sa.String()),
+        sa.Column('cluster_name', sa.String()),
+        sa.Column('resource_type', sa.String()),
+        sa.Column('resource_name', sa.String()),
+        sa.Column('recommendation_type', sa.String()),
+        sa.Column('current_value', sa.Float()),
+        sa.Column('recommended_value', sa.Float()),
+        sa.Column('potential_savings', sa.Float()),
+        sa.Column('confidence_score', sa.Float()),
+        sa.Column('priority', sa.String()),
+        sa.Column('description', sa.Text()),
+        sa.Column('implementation_steps', sa.JSON()),
+        sa.Column('status', sa.String()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('implemented_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_optimization_recommendations_id', 'optimization_recommendations', ['id'])
+    op.create_index('ix_optimization_recommendations_namespace', 'optimization_recommendations', ['namespace'])
+
+
+def downgrade() -> None:
+    op.drop_table('optimization_recommendations')
+    op.drop_table('cost_comparison')
+    op.drop_table('namespace_cost_allocation')
+    op.drop_table('kubernetes_metrics')
+    op.drop_table('azure_cost_data')
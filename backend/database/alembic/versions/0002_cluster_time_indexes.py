@@ -0,0 +1,31 @@
+"""Composite cluster/time indexes for metrics and allocations
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-15 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_km_cluster_ts_ns', 'kubernetes_metrics', ['cluster_name', 'timestamp', 'namespace']
+    )
+    op.create_index(
+        'ix_nca_cluster_period', 'namespace_cost_allocation',
+        ['cluster_name', 'period_start', 'period_end', 'namespace']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_nca_cluster_period', table_name='namespace_cost_allocation')
+    op.drop_index('ix_km_cluster_ts_ns', table_name='kubernetes_metrics')
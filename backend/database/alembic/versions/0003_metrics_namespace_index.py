@@ -0,0 +1,26 @@
+"""Cluster/namespace/time index for the efficiency metrics GROUP BY
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-15 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_km_cluster_ns_ts', 'kubernetes_metrics', ['cluster_name', 'namespace', 'timestamp']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_km_cluster_ns_ts', table_name='kubernetes_metrics')
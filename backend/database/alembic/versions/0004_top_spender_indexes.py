@@ -0,0 +1,39 @@
+"""Covering indexes for the top-spender and service breakdown scans
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-15 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Rebuild with total_cost INCLUDEd so the grouped namespace scan is index-only
+    op.drop_index('ix_nca_cluster_period', table_name='namespace_cost_allocation')
+    op.create_index(
+        'ix_nca_cluster_period', 'namespace_cost_allocation',
+        ['cluster_name', 'period_start', 'period_end', 'namespace'],
+        postgresql_include=['total_cost']
+    )
+    op.create_index(
+        'ix_azure_date_service', 'azure_cost_data', ['date', 'service_name'],
+        postgresql_include=['cost']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_azure_date_service', table_name='azure_cost_data')
+    op.drop_index('ix_nca_cluster_period', table_name='namespace_cost_allocation')
+    op.create_index(
+        'ix_nca_cluster_period', 'namespace_cost_allocation',
+        ['cluster_name', 'period_start', 'period_end', 'namespace']
+    )
@@ -0,0 +1,37 @@
+"""Integer priority rank and keyset index for recommendations
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-15 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('optimization_recommendations', sa.Column('priority_rank', sa.Integer()))
+    # Same mapping as models.cost_models.PRIORITY_RANKS; unknown priorities sort last
+    op.execute(
+        "UPDATE optimization_recommendations SET priority_rank = CASE priority "
+        "WHEN 'high' THEN 2 WHEN 'medium' THEN 1 ELSE 0 END"
+    )
+    with op.batch_alter_table('optimization_recommendations') as batch_op:
+        batch_op.alter_column('priority_rank', existing_type=sa.Integer(), nullable=False)
+    op.create_index(
+        'ix_rec_cluster_priority_savings', 'optimization_recommendations',
+        ['cluster_name', 'priority_rank', 'potential_savings', 'id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rec_cluster_priority_savings', table_name='optimization_recommendations')
+    with op.batch_alter_table('optimization_recommendations') as batch_op:
+        batch_op.drop_column('priority_rank')
@@ -0,0 +1,35 @@
+"""Partial index over pending recommendations in listing order
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-15 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_rec_pending', 'optimization_recommendations',
+        [
+            'cluster_name',
+            'namespace',
+            sa.text('priority_rank DESC'),
+            sa.text('potential_savings DESC'),
+            sa.text('id DESC')
+        ],
+        postgresql_where=sa.text("status = 'pending'"),
+        sqlite_where=sa.text("status = 'pending'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rec_pending', table_name='optimization_recommendations')
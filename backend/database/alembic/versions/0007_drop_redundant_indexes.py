@@ -0,0 +1,38 @@
+"""Drop single-column indexes covered by primary keys or composites
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-15 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# (index, table, columns); the id indexes duplicate the primary keys
+REDUNDANT_INDEXES = [
+    ('ix_azure_cost_data_id', 'azure_cost_data', ['id']),
+    ('ix_azure_cost_data_date', 'azure_cost_data', ['date']),
+    ('ix_kubernetes_metrics_id', 'kubernetes_metrics', ['id']),
+    ('ix_kubernetes_metrics_namespace', 'kubernetes_metrics', ['namespace']),
+    ('ix_kubernetes_metrics_timestamp', 'kubernetes_metrics', ['timestamp']),
+    ('ix_namespace_cost_allocation_id', 'namespace_cost_allocation', ['id']),
+    ('ix_cost_comparison_id', 'cost_comparison', ['id']),
+    ('ix_optimization_recommendations_id', 'optimization_recommendations', ['id']),
+]
+
+
+def upgrade() -> None:
+    for index_name, table_name, _ in REDUNDANT_INDEXES:
+        op.drop_index(index_name, table_name=table_name, if_exists=True)
+
+
+def downgrade() -> None:
+    for index_name, table_name, columns in REDUNDANT_INDEXES:
+        op.create_index(index_name, table_name, columns, if_not_exists=True)
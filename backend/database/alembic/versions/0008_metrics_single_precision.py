@@ -0,0 +1,42 @@
+"""Store Kubernetes resource metrics as single-precision REAL
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-15 00:00:00
+
+On PostgreSQL this rewrites kubernetes_metrics under an exclusive lock,
+so run it in a maintenance window on large tables.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+METRIC_COLUMNS = [
+    'cpu_requests',
+    'cpu_limits',
+    'cpu_usage',
+    'memory_requests',
+    'memory_limits',
+    'memory_usage',
+    'storage_requests',
+    'storage_usage',
+]
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('kubernetes_metrics') as batch_op:
+        for column in METRIC_COLUMNS:
+            batch_op.alter_column(column, existing_type=sa.Float(), type_=sa.REAL())
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('kubernetes_metrics') as batch_op:
+        for column in METRIC_COLUMNS:
+            batch_op.alter_column(column, existing_type=sa.REAL(), type_=sa.Float())
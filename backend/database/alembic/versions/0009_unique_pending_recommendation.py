@@ -0,0 +1,36 @@
+"""One pending recommendation per target
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-15 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Earlier runs stored duplicate pending rows; keep the newest of each target
+    op.execute(
+        "DELETE FROM optimization_recommendations WHERE status = 'pending' AND id NOT IN ("
+        "SELECT MAX(id) FROM optimization_recommendations WHERE status = 'pending' "
+        "GROUP BY cluster_name, namespace, resource_name, resource_type, recommendation_type)"
+    )
+    op.create_index(
+        'uq_rec_pending_target', 'optimization_recommendations',
+        ['cluster_name', 'namespace', 'resource_name', 'resource_type', 'recommendation_type'],
+        unique=True,
+        postgresql_where=sa.text("status = 'pending'"),
+        sqlite_where=sa.text("status = 'pending'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_rec_pending_target', table_name='optimization_recommendations')
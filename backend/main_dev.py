@@ -1,19 +1,23 @@
 """Development FastAPI application for CloudCostGuard"""
 
 import asyncio
+import orjson
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse
 
 # Import development configuration
 from core.config_dev import settings
+from core.logging_config import configure_logging
 
 # Import development routers
 from api.cost_routes import router as cost_router
 from api.recommendations_routes import router as recommendations_router
 from api.analytics_routes import router as analytics_router
 
+configure_logging(settings.log_level)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -39,6 +43,7 @@ app = FastAPI(
     docs_url=f"{settings.api_v1_prefix}/docs",
     redoc_url=f"{settings.api_v1_prefix}/redoc",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS
@@ -46,10 +51,30 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.backend_cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
+# Opt-in request profiling: append ?profile=1 to any URL to get the call stack as HTML.
+# pyinstrument only ships with requirements_dev.txt, so skip the middleware when it is missing
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+if settings.debug and Profiler is not None:
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if not request.query_params.get("profile"):
+            return await call_next(request)
+        
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        await call_next(request)
+        profiler.stop()
+        return HTMLResponse(profiler.output_html())
+
 # Include routers
 app.include_router(
     cost_router,
@@ -70,34 +95,60 @@ app.include_router(
 )
 
 
-@app.get("/")
-async def root():
-    """Root endpoint"""
-    return {
+class StaticJSONEndpoint:
+    """
+    Bare ASGI endpoint replying with a JSON body encoded once at startup
+    """
+
+    def __init__(self, payload: dict):
+        self.body = orjson.dumps(payload)
+        self.headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(self.body)).encode())
+        ]
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": self.headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else self.body})
+
+
+# Root and health payloads only depend on settings, so skip Request/Response handling entirely
+app.router.add_route(
+    "/",
+    StaticJSONEndpoint({
         "message": "Welcome to CloudCostGuard Development Server",
         "version": settings.version,
         "docs": f"{settings.api_v1_prefix}/docs",
         "status": "running"
-    }
-
+    }),
+    methods=["GET", "HEAD"],
+    include_in_schema=False
+)
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {
+app.router.add_route(
+    "/health",
+    StaticJSONEndpoint({
         "status": "healthy",
         "version": settings.version,
         "debug": settings.debug,
         "mock_data": settings.enable_mock_data
-    }
+    }),
+    methods=["GET", "HEAD"],
+    include_in_schema=False
+)
 
 
 if __name__ == "__main__":
     import uvicorn
+    # reload is for local development only; production runs api.main without it
     uvicorn.run(
         "main_dev:app",
         host="0.0.0.0",
         port=8000,
+        loop="uvloop",
+        http="httptools",
         reload=True,
-        log_level="info"
+        log_level="info",
+        proxy_headers=False,
+        access_log=False
     )
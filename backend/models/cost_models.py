@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON, Index, REAL, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.database import Base
@@ -7,7 +7,7 @@ from core.database import Base
 class AzureCostData(Base):
     __tablename__ = "azure_cost_data"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     subscription_id = Column(String, index=True)
     resource_group = Column(String, index=True)
     resource_name = Column(String)
@@ -15,40 +15,50 @@ class AzureCostData(Base):
     service_name = Column(String)
     cost = Column(Float)
     currency = Column(String, default="USD")
-    date = Column(DateTime, index=True)
+    date = Column(DateTime)
     billing_period = Column(String)
     tags = Column(JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
-    namespace_allocation = relationship("NamespaceCostAllocation", back_populates="azure_cost")
+    namespace_allocation = relationship("NamespaceCostAllocation", back_populates="azure_cost", lazy="raise")
+    
+    __table_args__ = (
+        Index("ix_azure_date_service", "date", "service_name", postgresql_include=["cost"]),
+    )
 
 
 class KubernetesMetrics(Base):
     __tablename__ = "kubernetes_metrics"
     
-    id = Column(Integer, primary_key=True, index=True)
-    namespace = Column(String, index=True)
+    id = Column(Integer, primary_key=True)
+    namespace = Column(String)
     pod_name = Column(String)
     deployment_name = Column(String)
-    cpu_requests = Column(Float)
-    cpu_limits = Column(Float)
-    cpu_usage = Column(Float)
-    memory_requests = Column(Float)
-    memory_limits = Column(Float)
-    memory_usage = Column(Float)
-    storage_requests = Column(Float)
-    storage_usage = Column(Float)
-    timestamp = Column(DateTime, index=True)
+    # Resource amounts only feed utilization ratios, so single precision is plenty
+    cpu_requests = Column(REAL)
+    cpu_limits = Column(REAL)
+    cpu_usage = Column(REAL)
+    memory_requests = Column(REAL)
+    memory_limits = Column(REAL)
+    memory_usage = Column(REAL)
+    storage_requests = Column(REAL)
+    storage_usage = Column(REAL)
+    timestamp = Column(DateTime)
     cluster_name = Column(String)
     labels = Column(JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_km_cluster_ts_ns", "cluster_name", "timestamp", "namespace"),
+        Index("ix_km_cluster_ns_ts", "cluster_name", "namespace", "timestamp"),
+    )
 
 
 class NamespaceCostAllocation(Base):
     __tablename__ = "namespace_cost_allocation"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     namespace = Column(String, index=True)
     cluster_name = Column(String)
     total_cost = Column(Float)
@@ -63,14 +73,21 @@ class NamespaceCostAllocation(Base):
     azure_cost_id = Column(Integer, ForeignKey("azure_cost_data.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        Index(
+            "ix_nca_cluster_period", "cluster_name", "period_start", "period_end", "namespace",
+            postgresql_include=["total_cost"]
+        ),
+    )
+    
     # Relationships
-    azure_cost = relationship("AzureCostData", back_populates="namespace_allocation")
+    azure_cost = relationship("AzureCostData", back_populates="namespace_allocation", lazy="raise")
 
 
 class CostComparison(Base):
     __tablename__ = "cost_comparison"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     namespace = Column(String, index=True)
     cluster_name = Column(String)
     current_period_cost = Column(Float)
@@ -85,10 +102,18 @@ class CostComparison(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+# Sort rank for the string priority, so listings order high > medium > low
+PRIORITY_RANKS = {"high": 2, "medium": 1, "low": 0}
+
+
+def _priority_rank(context):
+    return PRIORITY_RANKS.get(context.get_current_parameters().get("priority"), 0)
+
+
 class OptimizationRecommendation(Base):
     __tablename__ = "optimization_recommendations"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     namespace = Column(String, index=True)
     cluster_name = Column(String)
     resource_type = Column(String)  # cpu, memory, storage, etc.
@@ -99,8 +124,36 @@ class OptimizationRecommendation(Base):
     potential_savings = Column(Float)
     confidence_score = Column(Float)  # 0-1
     priority = Column(String)  # high, medium, low
+    priority_rank = Column(Integer, nullable=False, default=_priority_rank)  # 2, 1, 0; filled from priority on insert
     description = Column(Text)
     implementation_steps = Column(JSON)
     status = Column(String, default="pending")  # pending, implemented, dismissed
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     implemented_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Serves the listing's ORDER BY ... DESC and keyset cursor via a backward scan
+    __table_args__ = (
+        Index("ix_rec_cluster_priority_savings", "cluster_name", "priority_rank", "potential_savings", "id"),
+        # At most one pending recommendation per target; regeneration upserts against it
+        Index(
+            "uq_rec_pending_target",
+            "cluster_name", "namespace", "resource_name", "resource_type", "recommendation_type",
+            unique=True,
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'")
+        ),
+    )
+
+
+# Pending rows only, which stay few while implemented/dismissed history grows; in the
+# listing's sort order so pending pages per namespace read straight off the index
+Index(
+    "ix_rec_pending",
+    OptimizationRecommendation.cluster_name,
+    OptimizationRecommendation.namespace,
+    OptimizationRecommendation.priority_rank.desc(),
+    OptimizationRecommendation.potential_savings.desc(),
+    OptimizationRecommendation.id.desc(),
+    postgresql_where=text("status = 'pending'"),
+    sqlite_where=text("status = 'pending'")
+)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -24,7 +24,12 @@ class StatusEnum(str, Enum):
     DISMISSED = "dismissed"
 
 
-class AzureCostDataBase(BaseModel):
+class RecordModel(BaseModel):
+    # Stored records are built internally and never mutated, so fix their shape
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+
+class AzureCostDataBase(RecordModel):
     subscription_id: str
     resource_group: str
     resource_name: str
@@ -45,11 +50,10 @@ class AzureCostData(AzureCostDataBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
-class KubernetesMetricsBase(BaseModel):
+class KubernetesMetricsBase(RecordModel):
     namespace: str
     pod_name: str
     deployment_name: str
@@ -74,11 +78,10 @@ class KubernetesMetrics(KubernetesMetricsBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
-class NamespaceCostAllocationBase(BaseModel):
+class NamespaceCostAllocationBase(RecordModel):
     namespace: str
     cluster_name: str
     total_cost: float
@@ -101,11 +104,10 @@ class NamespaceCostAllocation(NamespaceCostAllocationBase):
     azure_cost_id: Optional[int] = None
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
-class CostComparisonBase(BaseModel):
+class CostComparisonBase(RecordModel):
     namespace: str
     cluster_name: str
     current_period_cost: float
@@ -127,11 +129,10 @@ class CostComparison(CostComparisonBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
-class OptimizationRecommendationBase(BaseModel):
+class OptimizationRecommendationBase(RecordModel):
     namespace: str
     cluster_name: str
     resource_type: str
@@ -153,11 +154,11 @@ class OptimizationRecommendationCreate(OptimizationRecommendationBase):
 
 class OptimizationRecommendation(OptimizationRecommendationBase):
     id: int
+    priority_rank: int
     created_at: datetime
     implemented_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class CostOverviewResponse(BaseModel):
@@ -1,15 +1,44 @@
 import asyncio
+import time
+import orjson
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
-from core.database import get_db
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from core.cache import TTLCache
+from core.database import AsyncSessionLocal
+from core.periods import utcnow
 from models.cost_models import KubernetesMetrics, NamespaceCostAllocation, OptimizationRecommendation
-from models.schemas import OptimizationRecommendationCreate, RecommendationTypeEnum, PriorityEnum
+from models.schemas import OptimizationRecommendationCreate, RecommendationTypeEnum, PriorityEnum, StatusEnum
 import structlog
 
 logger = structlog.get_logger()
 
+INSERT_CHUNK_SIZE = 500
+
+# A pending recommendation is identified by what it targets, matching uq_rec_pending_target
+PENDING_TARGET_COLUMNS = ["cluster_name", "namespace", "resource_name", "resource_type", "recommendation_type"]
+PENDING_UPDATE_COLUMNS = [
+    "current_value", "recommended_value", "potential_savings", "confidence_score",
+    "priority", "priority_rank", "description", "implementation_steps"
+]
+
+# Monthly prices used to estimate savings (30-day month)
+GIB = 1024 ** 3
+HOURS_PER_MONTH = 24 * 30
+CPU_MONTHLY_COST_PER_CORE = 0.05 * HOURS_PER_MONTH  # $0.05 per core per hour
+MEMORY_MONTHLY_COST_PER_BYTE = 0.01 * HOURS_PER_MONTH / GIB  # $0.01 per GB per hour
+STORAGE_MONTHLY_COST_PER_BYTE = 0.0001 * HOURS_PER_MONTH / GIB  # $0.0001 per GB per hour
+
+# Per-process: generated recommendations per (cluster, days_back, clock hour) and a digest
+# of the last set stored for each cluster. Beat runs generation every two hours, so a
+# scheduled run never finds the previous one's entry; hits come from a retried run in
+# the same hour (after a failed store, say), which then neither re-aggregates nor re-stores
+_generated_recommendations = TTLCache(ttl=3600)
+_stored_digests: Dict[str, int] = {}
+
 
 class RecommendationEngine:
     def __init__(self):
@@ -22,38 +51,34 @@ class RecommendationEngine:
         self,
         cluster_name: str = "default",
         days_back: int = 7
-    ) -> List[OptimizationRecommendation]:
+    ) -> List[OptimizationRecommendationCreate]:
         """
         Generate optimization recommendations based on usage patterns
         """
         try:
             recommendations = []
-            period_start = datetime.utcnow() - timedelta(days=days_back)
-            period_end = datetime.utcnow()
+            period_end = utcnow()
+            period_start = period_end - timedelta(days=days_back)
             
-            async for db in get_db():
-                # Get resource utilization data
-                utilization_data = await self._get_resource_utilization(
-                    db, period_start, period_end, cluster_name
+            # Utilization and cost data are independent, so fetch them on separate connections at once
+            async with AsyncSessionLocal() as db, AsyncSessionLocal() as cost_db:
+                utilization_data, cost_data = await asyncio.gather(
+                    self._get_resource_utilization(db, period_start, period_end, cluster_name),
+                    self._get_namespace_costs(cost_db, period_start, period_end, cluster_name)
                 )
-                
-                # Get cost data for savings calculation
-                cost_data = await self._get_namespace_costs(
-                    db, period_start, period_end, cluster_name
+            
+            # Generate recommendations for each resource
+            for resource in utilization_data:
+                resource_recommendations = await self._analyze_resource(
+                    resource, cost_data.get(resource['namespace'], 0), cluster_name
                 )
-                
-                # Generate recommendations for each resource
-                for resource in utilization_data:
-                    resource_recommendations = await self._analyze_resource(
-                        resource, cost_data.get(resource['namespace'], 0)
-                    )
-                    recommendations.extend(resource_recommendations)
+                recommendations.extend(resource_recommendations)
             
-            logger.info(f"Generated {len(recommendations)} optimization recommendations")
+            logger.info("Generated optimization recommendations", count=len(recommendations))
             return recommendations
             
         except Exception as e:
-            logger.error(f"Error generating recommendations: {str(e)}")
+            logger.exception("Error generating recommendations", error=str(e))
             raise
     
     async def _get_resource_utilization(
@@ -67,74 +92,53 @@ class RecommendationEngine:
         Get resource utilization data for analysis
         """
         try:
-            query = select(KubernetesMetrics).where(
-                and_(
-                    KubernetesMetrics.timestamp >= period_start,
-                    KubernetesMetrics.timestamp <= period_end,
-                    KubernetesMetrics.cluster_name == cluster_name
-                )
-            )
+            # Aggregate by namespace and deployment in the database
+            query = select(
+                KubernetesMetrics.namespace,
+                KubernetesMetrics.deployment_name,
+                func.sum(KubernetesMetrics.cpu_usage).label("cpu_usage_sum"),
+                func.sum(KubernetesMetrics.cpu_requests).label("cpu_requests_sum"),
+                func.avg(KubernetesMetrics.cpu_requests).label("cpu_requests_avg"),
+                func.sum(KubernetesMetrics.memory_usage).label("memory_usage_sum"),
+                func.sum(KubernetesMetrics.memory_requests).label("memory_requests_sum"),
+                func.avg(KubernetesMetrics.memory_requests).label("memory_requests_avg"),
+                func.sum(KubernetesMetrics.storage_usage).label("storage_usage_sum"),
+                func.sum(KubernetesMetrics.storage_requests).label("storage_requests_sum"),
+                func.avg(KubernetesMetrics.storage_requests).label("storage_requests_avg")
+            ).where(
+                KubernetesMetrics.timestamp >= period_start,
+                KubernetesMetrics.timestamp <= period_end,
+                KubernetesMetrics.cluster_name == cluster_name
+            ).group_by(KubernetesMetrics.namespace, KubernetesMetrics.deployment_name)
             result = await db.execute(query)
-            metrics = result.scalars().all()
-            
-            # Aggregate by namespace and deployment
-            resource_data = {}
-            for metric in metrics:
-                key = f"{metric.namespace}:{metric.deployment_name}"
-                if key not in resource_data:
-                    resource_data[key] = {
-                        'namespace': metric.namespace,
-                        'deployment_name': metric.deployment_name,
-                        'cpu_requests': [],
-                        'cpu_limits': [],
-                        'cpu_usage': [],
-                        'memory_requests': [],
-                        'memory_limits': [],
-                        'memory_usage': [],
-                        'storage_requests': [],
-                        'storage_usage': []
-                    }
-                
-                resource_data[key]['cpu_requests'].append(metric.cpu_requests)
-                resource_data[key]['cpu_limits'].append(metric.cpu_limits)
-                resource_data[key]['cpu_usage'].append(metric.cpu_usage)
-                resource_data[key]['memory_requests'].append(metric.memory_requests)
-                resource_data[key]['memory_limits'].append(metric.memory_limits)
-                resource_data[key]['memory_usage'].append(metric.memory_usage)
-                resource_data[key]['storage_requests'].append(metric.storage_requests)
-                resource_data[key]['storage_usage'].append(metric.storage_usage)
             
-            # Calculate averages
+            # Utilization is total usage over total requests across the period's samples
             utilization_list = []
-            for key, data in resource_data.items():
-                avg_cpu_utilization = (
-                    sum(data['cpu_usage']) / sum(data['cpu_requests']) 
-                    if sum(data['cpu_requests']) > 0 else 0
-                )
-                avg_memory_utilization = (
-                    sum(data['memory_usage']) / sum(data['memory_requests']) 
-                    if sum(data['memory_requests']) > 0 else 0
-                )
-                avg_storage_utilization = (
-                    sum(data['storage_usage']) / sum(data['storage_requests']) 
-                    if sum(data['storage_requests']) > 0 else 0
-                )
-                
+            for row in result.mappings():
                 utilization_list.append({
-                    'namespace': data['namespace'],
-                    'deployment_name': data['deployment_name'],
-                    'avg_cpu_utilization': avg_cpu_utilization,
-                    'avg_memory_utilization': avg_memory_utilization,
-                    'avg_storage_utilization': avg_storage_utilization,
-                    'current_cpu_requests': sum(data['cpu_requests']) / len(data['cpu_requests']),
-                    'current_memory_requests': sum(data['memory_requests']) / len(data['memory_requests']),
-                    'current_storage_requests': sum(data['storage_requests']) / len(data['storage_requests'])
+                    'namespace': row['namespace'],
+                    'deployment_name': row['deployment_name'],
+                    'avg_cpu_utilization': (
+                        row['cpu_usage_sum'] / row['cpu_requests_sum']
+                        if row['cpu_requests_sum'] else 0
+                    ),
+                    'avg_memory_utilization': (
+                        row['memory_usage_sum'] / row['memory_requests_sum']
+                        if row['memory_requests_sum'] else 0
+                    ),
+                    'avg_storage_utilization': (
+                        row['storage_usage_sum'] / row['storage_requests_sum']
+                        if row['storage_requests_sum'] else 0
+                    ),
+                    'current_cpu_requests': row['cpu_requests_avg'],
+                    'current_memory_requests': row['memory_requests_avg'],
+                    'current_storage_requests': row['storage_requests_avg']
                 })
             
             return utilization_list
             
         except Exception as e:
-            logger.error(f"Error getting resource utilization: {str(e)}")
+            logger.exception("Error getting resource utilization", error=str(e))
             return []
     
     async def _get_namespace_costs(
@@ -148,41 +152,45 @@ class RecommendationEngine:
         Get costs by namespace for savings calculation
         """
         try:
-            query = select(NamespaceCostAllocation).where(
-                and_(
-                    NamespaceCostAllocation.period_start >= period_start,
-                    NamespaceCostAllocation.period_end <= period_end,
-                    NamespaceCostAllocation.cluster_name == cluster_name
-                )
+            query = select(
+                NamespaceCostAllocation.namespace,
+                NamespaceCostAllocation.total_cost
+            ).where(
+                NamespaceCostAllocation.period_start >= period_start,
+                NamespaceCostAllocation.period_end <= period_end,
+                NamespaceCostAllocation.cluster_name == cluster_name
             )
             result = await db.execute(query)
-            allocations = result.scalars().all()
             
-            return {allocation.namespace: allocation.total_cost for allocation in allocations}
+            return dict(result.all())
             
         except Exception as e:
-            logger.error(f"Error getting namespace costs: {str(e)}")
+            logger.exception("Error getting namespace costs", error=str(e))
             return {}
     
     async def _analyze_resource(
         self,
         resource: Dict[str, Any],
-        namespace_cost: float
+        namespace_cost: float,
+        cluster_name: str = "default"
     ) -> List[OptimizationRecommendationCreate]:
         """
         Analyze a single resource and generate recommendations
         """
         recommendations = []
         
+        # Every field below is computed here from our own metrics, so the models are
+        # built without validation; never construct them this way from external input
+        
         # CPU over-provisioning check
         if resource['avg_cpu_utilization'] < self.cpu_utilization_threshold:
             recommended_cpu = resource['current_cpu_requests'] * 0.5  # Recommend 50% reduction
-            potential_savings = (resource['current_cpu_requests'] - recommended_cpu) * 0.05 * 24 * 30  # $0.05 per core per hour
+            potential_savings = (resource['current_cpu_requests'] - recommended_cpu) * CPU_MONTHLY_COST_PER_CORE
             
             if potential_savings > self.cost_savings_threshold:
-                recommendation = OptimizationRecommendationCreate(
+                recommendation = OptimizationRecommendationCreate.model_construct(
                     namespace=resource['namespace'],
-                    cluster_name="default",
+                    cluster_name=cluster_name,
                     resource_type="cpu",
                     resource_name=resource['deployment_name'],
                     recommendation_type=RecommendationTypeEnum.RIGHT_SIZE,
@@ -203,12 +211,12 @@ class RecommendationEngine:
         # Memory over-provisioning check
         if resource['avg_memory_utilization'] < self.memory_utilization_threshold:
             recommended_memory = resource['current_memory_requests'] * 0.6  # Recommend 40% reduction
-            potential_savings = ((resource['current_memory_requests'] - recommended_memory) / (1024**3)) * 0.01 * 24 * 30  # $0.01 per GB per hour
+            potential_savings = (resource['current_memory_requests'] - recommended_memory) * MEMORY_MONTHLY_COST_PER_BYTE
             
             if potential_savings > self.cost_savings_threshold:
-                recommendation = OptimizationRecommendationCreate(
+                recommendation = OptimizationRecommendationCreate.model_construct(
                     namespace=resource['namespace'],
-                    cluster_name="default",
+                    cluster_name=cluster_name,
                     resource_type="memory",
                     resource_name=resource['deployment_name'],
                     recommendation_type=RecommendationTypeEnum.RIGHT_SIZE,
@@ -217,7 +225,7 @@ class RecommendationEngine:
                     potential_savings=potential_savings,
                     confidence_score=min(0.9, 1.0 - resource['avg_memory_utilization']),
                     priority=PriorityEnum.MEDIUM,
-                    description=f"Memory utilization is only {resource['avg_memory_utilization']:.1%}. Consider reducing memory requests from {resource['current_memory_requests']/(1024**3):.2f}GB to {recommended_memory/(1024**3):.2f}GB.",
+                    description=f"Memory utilization is only {resource['avg_memory_utilization']:.1%}. Consider reducing memory requests from {resource['current_memory_requests'] / GIB:.2f}GB to {recommended_memory / GIB:.2f}GB.",
                     implementation_steps=[
                         f"Update deployment {resource['deployment_name']} memory requests",
                         "Monitor for OOM errors",
@@ -229,12 +237,12 @@ class RecommendationEngine:
         # Storage under-utilization check
         if resource['avg_storage_utilization'] < self.storage_utilization_threshold and resource['current_storage_requests'] > 0:
             recommended_storage = resource['current_storage_requests'] * 0.7  # Recommend 30% reduction
-            potential_savings = ((resource['current_storage_requests'] - recommended_storage) / (1024**3)) * 0.0001 * 24 * 30  # $0.0001 per GB per hour
+            potential_savings = (resource['current_storage_requests'] - recommended_storage) * STORAGE_MONTHLY_COST_PER_BYTE
             
             if potential_savings > self.cost_savings_threshold:
-                recommendation = OptimizationRecommendationCreate(
+                recommendation = OptimizationRecommendationCreate.model_construct(
                     namespace=resource['namespace'],
-                    cluster_name="default",
+                    cluster_name=cluster_name,
                     resource_type="storage",
                     resource_name=resource['deployment_name'],
                     recommendation_type=RecommendationTypeEnum.RIGHT_SIZE,
@@ -254,45 +262,86 @@ class RecommendationEngine:
         
         return recommendations
     
-    async def store_recommendations(self, db: AsyncSession, recommendations: List[OptimizationRecommendation]):
+    async def store_recommendations(
+        self,
+        db: AsyncSession,
+        recommendations: List[OptimizationRecommendationCreate],
+        cluster_name: str = "default"
+    ):
         """
-        Store recommendations in the database
+        Upsert the cluster's pending recommendations and drop pending ones no longer generated.
+        A recommendation that is still current keeps its id, so clients can act on it by id
         """
         try:
-            for recommendation in recommendations:
-                db.add(recommendation)
+            dialect = db.bind.dialect.name
+            if dialect == "postgresql":
+                # Serialize concurrent runs for the cluster until this transaction ends
+                await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(cluster_name))))
+            
+            insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+            statement = insert(OptimizationRecommendation)
+            statement = statement.on_conflict_do_update(
+                index_elements=PENDING_TARGET_COLUMNS,
+                index_where=text("status = 'pending'"),
+                set_={column: statement.excluded[column] for column in PENDING_UPDATE_COLUMNS}
+            ).returning(OptimizationRecommendation.id)
+            
+            rows = [recommendation.dict() for recommendation in recommendations]
+            current_ids = []
+            for offset in range(0, len(rows), INSERT_CHUNK_SIZE):
+                result = await db.execute(statement, rows[offset:offset + INSERT_CHUNK_SIZE])
+                current_ids.extend(result.scalars())
+            
+            await db.execute(
+                delete(OptimizationRecommendation).where(
+                    OptimizationRecommendation.cluster_name == cluster_name,
+                    OptimizationRecommendation.status == StatusEnum.PENDING,
+                    OptimizationRecommendation.id.not_in(current_ids)
+                )
+            )
             
             await db.commit()
-            logger.info(f"Stored {len(recommendations)} optimization recommendations")
+            logger.info("Stored optimization recommendations", count=len(recommendations))
             
         except Exception as e:
             await db.rollback()
-            logger.error(f"Error storing recommendations: {str(e)}")
+            logger.exception("Error storing recommendations", error=str(e))
             raise
     
     async def run_recommendation_generation(
         self,
         cluster_name: str = "default",
-        days_back: int = 7
+        days_back: int = 7,
+        use_cache: bool = True
     ):
         """
-        Run the complete recommendation generation process
+        Run the complete recommendation generation process. With use_cache=False
+        (manual runs) recommendations are always regenerated from current data and stored
         """
-        logger.info(f"Starting recommendation generation for cluster {cluster_name}")
+        logger.info("Starting recommendation generation", cluster=cluster_name)
         
         try:
-            # Generate recommendations
-            recommendations = await self.generate_recommendations(cluster_name, days_back)
+            # Generate recommendations, reusing this hour's result for the cluster
+            cache_key = (cluster_name, days_back, int(time.time() // 3600))
+            recommendations = _generated_recommendations.get(cache_key) if use_cache else None
+            if recommendations is None:
+                recommendations = await self.generate_recommendations(cluster_name, days_back)
+                _generated_recommendations.set(cache_key, recommendations)
             
-            # Store recommendations
-            async for db in get_db():
-                await self.store_recommendations(db, recommendations)
+            # Store recommendations unless this process already stored the same set for the cluster
+            digest = hash(orjson.dumps([recommendation.dict() for recommendation in recommendations]))
+            if use_cache and _stored_digests.get(cluster_name) == digest:
+                logger.info("Recommendations unchanged since last store, skipping", cluster=cluster_name)
+            else:
+                async with AsyncSessionLocal() as db:
+                    await self.store_recommendations(db, recommendations, cluster_name)
+                _stored_digests[cluster_name] = digest
             
             logger.info("Recommendation generation completed successfully")
             return recommendations
             
         except Exception as e:
-            logger.error(f"Recommendation generation failed: {str(e)}")
+            logger.exception("Recommendation generation failed", error=str(e))
             raise
 
 
@@ -1,14 +1,24 @@
 import asyncio
+import threading
+import redis
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
+from celery.utils.time import get_exponential_backoff_interval
 from datetime import datetime
+from typing import List
+from redis.exceptions import LockError
 from cost_collectors.azure_collector import schedule_azure_collection
-from cost_collectors.kubernetes_collector import schedule_kubernetes_collection
+from cost_collectors.kubernetes_collector import schedule_kubernetes_collection, new_prometheus_session
 from analyzers.cost_analyzer import schedule_cost_analysis
 from analyzers.comparison_engine import schedule_cost_comparison
 from recommendations.recommendation_engine import schedule_recommendation_generation
 from core.config import settings
+from core.database import engine
+from core.logging_config import configure_logging
 import structlog
 
+configure_logging(settings.log_level)
 logger = structlog.get_logger()
 
 # Initialize Celery
@@ -20,37 +30,191 @@ celery_app = Celery(
 
 # Celery configuration
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    # Task payloads are job-name lists and results are None, so msgpack covers them;
+    # json stays accepted so messages queued before a deploy are still consumed
+    task_serializer="msgpack",
+    accept_content=["msgpack", "json"],
+    result_serializer="msgpack",
+    event_serializer="msgpack",
+    # Scheduled runs return nothing anyone reads; manual triggers opt back in below
+    task_ignore_result=True,
     timezone="UTC",
     enable_utc=True,
+    # Tasks mostly wait on network I/O and run for minutes, so each worker process
+    # reserves one message at a time and acknowledges it only once the task finishes
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    # Jobs are staggered within the hour so each stage runs after the data it reads has
+    # landed, and jobs sharing a tick go out as one run_due_jobs message awaited together:
+    #   :02        metrics + Azure costs (metrics then every 5 min from :07)
+    #   :10, :40   cost analysis
+    #   :20        comparisons, plus recommendations on even hours
     beat_schedule={
-        "collect-azure-costs": {
-            "task": "scheduler.tasks.collect_azure_costs",
-            "schedule": 3600.0,  # Every hour
+        "collect-metrics": {
+            "task": "scheduler.tasks.run_due_jobs",
+            "schedule": crontab(minute="7-57/5"),
+            "args": (["collect_kubernetes_metrics"],),
         },
-        "collect-kubernetes-metrics": {
-            "task": "scheduler.tasks.collect_kubernetes_metrics",
-            "schedule": 300.0,  # Every 5 minutes
+        "collect-metrics-and-azure-costs": {
+            "task": "scheduler.tasks.run_due_jobs",
+            "schedule": crontab(minute=2),
+            "args": (["collect_kubernetes_metrics", "collect_azure_costs"],),
         },
         "analyze-costs": {
-            "task": "scheduler.tasks.analyze_costs",
-            "schedule": 1800.0,  # Every 30 minutes
+            "task": "scheduler.tasks.run_due_jobs",
+            "schedule": crontab(minute="10,40"),
+            "args": (["analyze_costs"],),
         },
         "compare-costs": {
-            "task": "scheduler.tasks.compare_costs",
-            "schedule": 3600.0,  # Every hour
+            "task": "scheduler.tasks.run_due_jobs",
+            "schedule": crontab(minute=20, hour="1-23/2"),
+            "args": (["compare_costs"],),
         },
-        "generate-recommendations": {
-            "task": "scheduler.tasks.generate_recommendations",
-            "schedule": 7200.0,  # Every 2 hours
+        "compare-costs-and-generate-recommendations": {
+            "task": "scheduler.tasks.run_due_jobs",
+            "schedule": crontab(minute=20, hour="*/2"),
+            "args": (["compare_costs", "generate_recommendations"],),
         },
     },
 )
 
+# Retries back off exponentially (up to 30s, 60s, 120s, capped at 10 min) with full jitter,
+# so workers don't hit a struggling Azure or Prometheus endpoint in lockstep
+RETRY_BACKOFF = 30
+RETRY_BACKOFF_MAX = 600
+RETRY_OPTIONS = {
+    "autoretry_for": (Exception,),
+    "retry_backoff": RETRY_BACKOFF,
+    "retry_backoff_max": RETRY_BACKOFF_MAX,
+    "retry_jitter": True,
+    "max_retries": 3,
+}
+
+# One event loop per worker thread, reused by every task it runs. uvloop comes with
+# uvicorn[standard]; fall back to the stdlib loop where it isn't available (e.g. Windows)
+try:
+    import uvloop
+    new_event_loop = uvloop.new_event_loop
+except ImportError:
+    new_event_loop = asyncio.new_event_loop
+
+_worker_state = threading.local()
+
+
+def run_async(coro):
+    """
+    Run a coroutine to completion on this worker thread's long-lived event loop
+    """
+    loop = getattr(_worker_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = new_event_loop()
+        asyncio.set_event_loop(loop)
+        _worker_state.loop = loop
+    return loop.run_until_complete(coro)
+
+
+@worker_process_shutdown.connect
+def close_event_loop(**kwargs):
+    """
+    Close the Prometheus session and pooled database connections, then the loop, when the worker process exits
+    """
+    loop = getattr(_worker_state, "loop", None)
+    if loop is not None and not loop.is_closed():
+        session = getattr(_worker_state, "prometheus_session", None)
+        if session is not None:
+            loop.run_until_complete(session.close())
+        loop.run_until_complete(engine.dispose())
+        loop.close()
+
+
+async def _collect_kubernetes_metrics():
+    """
+    Collect metrics over this worker thread's Prometheus session, kept open between runs
+    """
+    session = getattr(_worker_state, "prometheus_session", None)
+    if session is None or session.closed:
+        session = _worker_state.prometheus_session = new_prometheus_session()
+    await schedule_kubernetes_collection(settings.prometheus_url, session=session)
+
+
+# Coroutine factories for the jobs beat dispatches through run_due_jobs
+SCHEDULED_JOBS = {
+    "collect_azure_costs": lambda: schedule_azure_collection(settings.azure_subscription_id),
+    "collect_kubernetes_metrics": _collect_kubernetes_metrics,
+    "analyze_costs": schedule_cost_analysis,
+    "compare_costs": schedule_cost_comparison,
+    "generate_recommendations": schedule_recommendation_generation,
+}
+
+# A job's lock lapses after its own cadence, so a crashed worker cannot block it for longer
+JOB_LOCK_TIMEOUTS = {
+    "collect_azure_costs": 3600,
+    "collect_kubernetes_metrics": 300,
+    "analyze_costs": 1800,
+    "compare_costs": 3600,
+    "generate_recommendations": 7200,
+}
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+
+
+async def _gather_jobs(jobs: List[str]) -> list:
+    """
+    Await the given jobs concurrently, returning each job's result or exception
+    """
+    return await asyncio.gather(*(SCHEDULED_JOBS[job]() for job in jobs), return_exceptions=True)
+
 
 @celery_app.task(bind=True, max_retries=3)
+def run_due_jobs(self, jobs: List[str]):
+    """
+    Scheduled task running every job due at this tick on one event loop
+    """
+    if "collect_azure_costs" in jobs and not settings.azure_subscription_id:
+        logger.warning("Azure subscription ID not configured, skipping collection")
+        jobs = [job for job in jobs if job != "collect_azure_costs"]
+    
+    # Skip jobs whose previous run is still going rather than racing it
+    locks = {}
+    for job in jobs:
+        lock = redis_client.lock(f"cloudcostguard:job-lock:{job}", timeout=JOB_LOCK_TIMEOUTS[job])
+        if lock.acquire(blocking=False):
+            locks[job] = lock
+        else:
+            logger.warning("Previous run still in progress, skipping job", job=job)
+    jobs = list(locks)
+    
+    if not jobs:
+        return
+    
+    logger.info("Starting scheduled jobs", jobs=jobs)
+    
+    try:
+        results = run_async(_gather_jobs(jobs))
+    finally:
+        for lock in locks.values():
+            try:
+                lock.release()
+            except LockError:
+                # Already expired, and possibly taken by a newer run
+                pass
+    
+    failures = {job: result for job, result in zip(jobs, results) if isinstance(result, Exception)}
+    for job, exc in failures.items():
+        logger.error("Scheduled job failed", job=job, error=str(exc))
+    
+    if failures:
+        # Only the failed jobs are retried
+        countdown = get_exponential_backoff_interval(
+            RETRY_BACKOFF, self.request.retries, RETRY_BACKOFF_MAX, full_jitter=True
+        )
+        raise self.retry(args=[list(failures)], exc=next(iter(failures.values())), countdown=countdown)
+    
+    logger.info("Scheduled jobs completed successfully", jobs=jobs)
+
+
+@celery_app.task(bind=True, **RETRY_OPTIONS)
 def collect_azure_costs(self):
     """
     Scheduled task to collect Azure cost data
@@ -62,21 +226,18 @@ def collect_azure_costs(self):
             logger.warning("Azure subscription ID not configured, skipping collection")
             return
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        loop.run_until_complete(
+        run_async(
             schedule_azure_collection(settings.azure_subscription_id)
         )
         
         logger.info("Azure cost collection completed successfully")
         
     except Exception as exc:
-        logger.error(f"Azure cost collection failed: {str(exc)}")
-        raise self.retry(exc=exc, countdown=60)
+        logger.exception("Azure cost collection failed", error=str(exc))
+        raise
 
 
-@celery_app.task(bind=True, max_retries=3)
+@celery_app.task(bind=True, **RETRY_OPTIONS)
 def collect_kubernetes_metrics(self):
     """
     Scheduled task to collect Kubernetes metrics
@@ -84,21 +245,18 @@ def collect_kubernetes_metrics(self):
     try:
         logger.info("Starting Kubernetes metrics collection task")
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        loop.run_until_complete(
-            schedule_kubernetes_collection(settings.prometheus_url)
+        run_async(
+            _collect_kubernetes_metrics()
         )
         
         logger.info("Kubernetes metrics collection completed successfully")
         
     except Exception as exc:
-        logger.error(f"Kubernetes metrics collection failed: {str(exc)}")
-        raise self.retry(exc=exc, countdown=60)
+        logger.exception("Kubernetes metrics collection failed", error=str(exc))
+        raise
 
 
-@celery_app.task(bind=True, max_retries=3)
+@celery_app.task(bind=True, **RETRY_OPTIONS)
 def analyze_costs(self):
     """
     Scheduled task to analyze costs and allocate to namespaces
@@ -106,21 +264,18 @@ def analyze_costs(self):
     try:
         logger.info("Starting cost analysis task")
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        loop.run_until_complete(
+        run_async(
             schedule_cost_analysis()
         )
         
         logger.info("Cost analysis completed successfully")
         
     except Exception as exc:
-        logger.error(f"Cost analysis failed: {str(exc)}")
-        raise self.retry(exc=exc, countdown=60)
+        logger.exception("Cost analysis failed", error=str(exc))
+        raise
 
 
-@celery_app.task(bind=True, max_retries=3)
+@celery_app.task(bind=True, **RETRY_OPTIONS)
 def compare_costs(self):
     """
     Scheduled task to compare costs between periods
@@ -128,21 +283,18 @@ def compare_costs(self):
     try:
         logger.info("Starting cost comparison task")
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        loop.run_until_complete(
+        run_async(
             schedule_cost_comparison()
         )
         
         logger.info("Cost comparison completed successfully")
         
     except Exception as exc:
-        logger.error(f"Cost comparison failed: {str(exc)}")
-        raise self.retry(exc=exc, countdown=60)
+        logger.exception("Cost comparison failed", error=str(exc))
+        raise
 
 
-@celery_app.task(bind=True, max_retries=3)
+@celery_app.task(bind=True, **RETRY_OPTIONS)
 def generate_recommendations(self):
     """
     Scheduled task to generate optimization recommendations
@@ -150,22 +302,22 @@ def generate_recommendations(self):
     try:
         logger.info("Starting recommendation generation task")
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        loop.run_until_complete(
+        run_async(
             schedule_recommendation_generation()
         )
         
         logger.info("Recommendation generation completed successfully")
         
     except Exception as exc:
-        logger.error(f"Recommendation generation failed: {str(exc)}")
-        raise self.retry(exc=exc, countdown=60)
+        logger.exception("Recommendation generation failed", error=str(exc))
+        raise
 
 
-# Manual trigger tasks for testing and on-demand execution
-@celery_app.task
+# Manual trigger tasks for testing and on-demand execution. These run the job in-process.
+# To run several jobs from one message, with the same overlap locks and retry of only the
+# failed jobs as scheduled runs, enqueue the dispatcher instead:
+#   run_due_jobs.apply_async(args=[["analyze_costs", "compare_costs"]], ignore_result=False)
+@celery_app.task(ignore_result=False)
 def manual_azure_collection():
     """
     Manually trigger Azure cost collection
@@ -173,7 +325,7 @@ def manual_azure_collection():
     return collect_azure_costs()
 
 
-@celery_app.task
+@celery_app.task(ignore_result=False)
 def manual_kubernetes_collection():
     """
     Manually trigger Kubernetes metrics collection
@@ -181,7 +333,7 @@ def manual_kubernetes_collection():
     return collect_kubernetes_metrics()
 
 
-@celery_app.task
+@celery_app.task(ignore_result=False)
 def manual_cost_analysis():
     """
     Manually trigger cost analysis
@@ -189,7 +341,7 @@ def manual_cost_analysis():
     return analyze_costs()
 
 
-@celery_app.task
+@celery_app.task(ignore_result=False)
 def manual_cost_comparison():
     """
     Manually trigger cost comparison
@@ -197,7 +349,7 @@ def manual_cost_comparison():
     return compare_costs()
 
 
-@celery_app.task
+@celery_app.task(ignore_result=False)
 def manual_recommendation_generation():
     """
     Manually trigger recommendation generation
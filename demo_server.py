@@ -5,314 +5,328 @@ This provides a basic demonstration without complex dependencies
 
 import json
 import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import threading
 import time
 
+# orjson is optional here: the demo must keep running on a bare Python install
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-class CloudCostGuardHandler(BaseHTTPRequestHandler):
-    def do_OPTIONS(self):
-        """Handle CORS preflight requests"""
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-        self.end_headers()
+# Placeholder swapped for the current time in the otherwise static bodies below
+TIMESTAMP_PLACEHOLDER = "__TS__"
 
-    def do_GET(self):
-        """Handle GET requests"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        if path == '/':
-            response = {
-                "message": "Welcome to CloudCostGuard Demo Server",
-                "version": "1.0.0-demo",
-                "status": "running",
-                "endpoints": [
-                    "/api/v1/costs/overview",
-                    "/api/v1/costs/namespaces",
-                    "/api/v1/recommendations/",
-                    "/api/v1/analytics/comparisons",
-                    "/health"
-                ]
-            }
-        elif path == '/health':
-            response = {
-                "status": "healthy",
-                "version": "1.0.0-demo",
-                "timestamp": datetime.datetime.now().isoformat()
+
+# Clients asking for this media type get indented JSON, e.g. for reading in a terminal
+PRETTY_JSON = 'application/json+pretty'
+
+
+def _encode(payload, pretty=False):
+    """Encode a response payload to JSON bytes, compact unless pretty, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2 if pretty else None)
+    if pretty:
+        return json.dumps(payload, indent=2).encode()
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def _stamp(template):
+    """Fill the current time into a pre-encoded body"""
+    return template.replace(TIMESTAMP_PLACEHOLDER.encode(), datetime.datetime.now().isoformat().encode())
+
+
+# Bodies for the fixed demo endpoints are encoded once at import
+HOME_BODY = _encode({
+    "message": "Welcome to CloudCostGuard Demo Server",
+    "version": "1.0.0-demo",
+    "status": "running",
+    "endpoints": [
+        "/api/v1/costs/overview",
+        "/api/v1/costs/namespaces",
+        "/api/v1/recommendations/",
+        "/api/v1/analytics/comparisons",
+        "/health"
+    ]
+})
+
+HEALTH_TEMPLATE = _encode({
+    "status": "healthy",
+    "version": "1.0.0-demo",
+    "timestamp": TIMESTAMP_PLACEHOLDER
+})
+
+OVERVIEW_TEMPLATE = _encode({
+    "total_cost": 12543.67,
+    "azure_cost": 8234.45,
+    "kubernetes_cost": 4309.22,
+    "period": "current_month",
+    "currency": "USD",
+    "change_percentage": 12.5,
+    "last_updated": TIMESTAMP_PLACEHOLDER
+})
+
+NAMESPACES_BODY = _encode({
+    "namespaces": [
+        {
+            "name": "production",
+            "cost": 2345.67,
+            "percentage": 54.3,
+            "resources": {
+                "cpu_cost": 1234.56,
+                "memory_cost": 890.11,
+                "storage_cost": 220.00
             }
-        elif path == '/api/v1/costs/overview':
-            response = {
-                "total_cost": 12543.67,
-                "azure_cost": 8234.45,
-                "kubernetes_cost": 4309.22,
-                "period": "current_month",
-                "currency": "USD",
-                "change_percentage": 12.5,
-                "last_updated": datetime.datetime.now().isoformat()
+        },
+        {
+            "name": "staging",
+            "cost": 1234.56,
+            "percentage": 28.6,
+            "resources": {
+                "cpu_cost": 678.90,
+                "memory_cost": 456.78,
+                "storage_cost": 98.88
             }
-        elif path == '/api/v1/costs/namespaces':
-            response = {
-                "namespaces": [
-                    {
-                        "name": "production",
-                        "cost": 2345.67,
-                        "percentage": 54.3,
-                        "resources": {
-                            "cpu_cost": 1234.56,
-                            "memory_cost": 890.11,
-                            "storage_cost": 220.00
-                        }
-                    },
-                    {
-                        "name": "staging",
-                        "cost": 1234.56,
-                        "percentage": 28.6,
-                        "resources": {
-                            "cpu_cost": 678.90,
-                            "memory_cost": 456.78,
-                            "storage_cost": 98.88
-                        }
-                    },
-                    {
-                        "name": "development",
-                        "cost": 728.99,
-                        "percentage": 16.9,
-                        "resources": {
-                            "cpu_cost": 345.67,
-                            "memory_cost": 289.12,
-                            "storage_cost": 94.20
-                        }
-                    }
-                ],
-                "total": 4309.22,
-                "currency": "USD"
+        },
+        {
+            "name": "development",
+            "cost": 728.99,
+            "percentage": 16.9,
+            "resources": {
+                "cpu_cost": 345.67,
+                "memory_cost": 289.12,
+                "storage_cost": 94.20
             }
-        elif path == '/api/v1/recommendations/':
+        }
+    ],
+    "total": 4309.22,
+    "currency": "USD"
+})
+
+RECOMMENDATIONS_TEMPLATE = _encode({
+    "recommendations": [
+        {
+            "id": 1,
+            "type": "right_sizing",
+            "title": "Right-size production namespace CPU",
+            "description": "CPU utilization is consistently below 30%, consider reducing CPU allocation",
+            "potential_savings": 234.56,
+            "confidence": 85,
+            "priority": "high",
+            "resource_type": "cpu",
+            "namespace": "production",
+            "status": "pending",
+            "created_at": TIMESTAMP_PLACEHOLDER
+        },
+        {
+            "id": 2,
+            "type": "storage_optimization",
+            "title": "Optimize storage in staging namespace",
+            "description": "Unused persistent volumes detected, cleanup can save costs",
+            "potential_savings": 123.45,
+            "confidence": 92,
+            "priority": "medium",
+            "resource_type": "storage",
+            "namespace": "staging",
+            "status": "pending",
+            "created_at": TIMESTAMP_PLACEHOLDER
+        },
+        {
+            "id": 3,
+            "type": "schedule_optimization",
+            "title": "Implement non-production scaling schedules",
+            "description": "Scale down development resources during non-working hours",
+            "potential_savings": 456.78,
+            "confidence": 78,
+            "priority": "medium",
+            "resource_type": "compute",
+            "namespace": "development",
+            "status": "pending",
+            "created_at": TIMESTAMP_PLACEHOLDER
+        }
+    ],
+    "total_recommendations": 3,
+    "total_potential_savings": 814.79,
+    "currency": "USD"
+})
+
+COMPARISONS_BODY = _encode({
+    "comparisons": [
+        {
+            "period": "current_month",
+            "cost": 12543.67,
+            "previous_period": "last_month",
+            "previous_cost": 11156.82,
+            "change_percentage": 12.5,
+            "change_amount": 1386.85,
+            "currency": "USD"
+        },
+        {
+            "period": "last_month",
+            "cost": 11156.82,
+            "previous_period": "two_months_ago",
+            "previous_cost": 10890.45,
+            "change_percentage": 2.4,
+            "change_amount": 266.37,
+            "currency": "USD"
+        }
+    ],
+    "trend": "increasing",
+    "average_monthly_change": 7.45
+})
+
+NOT_FOUND_BODY = _encode({"error": "Endpoint not found"})
+
+GENERATE_BODY = _encode({
+    "message": "Recommendations generation started",
+    "task_id": "demo-task-123",
+    "status": "in_progress"
+})
+
+STATUS_UPDATED_BODY = _encode({
+    "message": "Recommendation status updated successfully",
+    "status": "acknowledged"
+})
+
+
+# Status line and headers for every JSON reply, filled with the body length per request
+RESPONSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Content-Length: %d\r\n"
+    b"\r\n"
+)
+
+OPTIONS_RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Access-Control-Allow-Methods: GET, POST, PUT, DELETE, OPTIONS\r\n"
+    b"Access-Control-Allow-Headers: Content-Type, Authorization\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+
+
+def azure_cost_analysis(handler):
+    """Mock cost analysis for the subscription and resource group in the form body"""
+    post_data = handler.request_body
+    if post_data:
+        try:
+            import urllib.parse
+            data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+            subscription_id = data.get('subscriptionId', [''])[0]
+            resource_group = data.get('resourceGroup', [''])[0]
+
+            # Generate mock cost data based on inputs
+            import random
+            total_cost = random.uniform(1000, 6000)
+
             response = {
-                "recommendations": [
+                "subscriptionId": subscription_id,
+                "resourceGroup": resource_group,
+                "totalCost": total_cost,
+                "currency": "USD",
+                "period": "current_month",
+                "breakdown": {
+                    "compute": random.uniform(500, 2500),
+                    "storage": random.uniform(200, 1200),
+                    "networking": random.uniform(100, 600),
+                    "other": random.uniform(50, 350)
+                },
+                "resources": [
                     {
-                        "id": 1,
-                        "type": "right_sizing",
-                        "title": "Right-size production namespace CPU",
-                        "description": "CPU utilization is consistently below 30%, consider reducing CPU allocation",
-                        "potential_savings": 234.56,
-                        "confidence": 85,
-                        "priority": "high",
-                        "resource_type": "cpu",
-                        "namespace": "production",
-                        "status": "pending",
-                        "created_at": datetime.datetime.now().isoformat()
+                        "name": f"{resource_group}-vm-01",
+                        "type": "Virtual Machine",
+                        "cost": random.uniform(100, 600)
                     },
                     {
-                        "id": 2,
-                        "type": "storage_optimization",
-                        "title": "Optimize storage in staging namespace",
-                        "description": "Unused persistent volumes detected, cleanup can save costs",
-                        "potential_savings": 123.45,
-                        "confidence": 92,
-                        "priority": "medium",
-                        "resource_type": "storage",
-                        "namespace": "staging",
-                        "status": "pending",
-                        "created_at": datetime.datetime.now().isoformat()
+                        "name": f"{resource_group}-storage-01",
+                        "type": "Storage Account",
+                        "cost": random.uniform(50, 250)
                     },
                     {
-                        "id": 3,
-                        "type": "schedule_optimization",
-                        "title": "Implement non-production scaling schedules",
-                        "description": "Scale down development resources during non-working hours",
-                        "potential_savings": 456.78,
-                        "confidence": 78,
-                        "priority": "medium",
-                        "resource_type": "compute",
-                        "namespace": "development",
-                        "status": "pending",
-                        "created_at": datetime.datetime.now().isoformat()
+                        "name": f"{resource_group}-sql-01",
+                        "type": "SQL Database",
+                        "cost": random.uniform(100, 400)
                     }
                 ],
-                "total_recommendations": 3,
-                "total_potential_savings": 814.79,
-                "currency": "USD"
+                "lastUpdated": datetime.datetime.now().isoformat()
             }
-        elif path == '/api/v1/analytics/comparisons':
-            response = {
-                "comparisons": [
-                    {
-                        "period": "current_month",
-                        "cost": 12543.67,
-                        "previous_period": "last_month",
-                        "previous_cost": 11156.82,
-                        "change_percentage": 12.5,
-                        "change_amount": 1386.85,
-                        "currency": "USD"
-                    },
-                    {
-                        "period": "last_month",
-                        "cost": 11156.82,
-                        "previous_period": "two_months_ago",
-                        "previous_cost": 10890.45,
-                        "change_percentage": 2.4,
-                        "change_amount": 266.37,
-                        "currency": "USD"
-                    }
-                ],
-                "trend": "increasing",
-                "average_monthly_change": 7.45
-            }
-        elif path == '/api/v1/azure/cost-analysis':
-            # Parse request body for Azure credentials
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length > 0:
-                post_data = self.rfile.read(content_length)
-                try:
-                    import urllib.parse
-                    data = urllib.parse.parse_qs(post_data.decode('utf-8'))
-                    subscription_id = data.get('subscriptionId', [''])[0]
-                    resource_group = data.get('resourceGroup', [''])[0]
-                    
-                    # Generate mock cost data based on inputs
-                    import random
-                    total_cost = random.uniform(1000, 6000)
-                    
-                    response = {
-                        "subscriptionId": subscription_id,
-                        "resourceGroup": resource_group,
-                        "totalCost": total_cost,
-                        "currency": "USD",
-                        "period": "current_month",
-                        "breakdown": {
-                            "compute": random.uniform(500, 2500),
-                            "storage": random.uniform(200, 1200),
-                            "networking": random.uniform(100, 600),
-                            "other": random.uniform(50, 350)
-                        },
-                        "resources": [
-                            {
-                                "name": f"{resource_group}-vm-01",
-                                "type": "Virtual Machine",
-                                "cost": random.uniform(100, 600)
-                            },
-                            {
-                                "name": f"{resource_group}-storage-01",
-                                "type": "Storage Account",
-                                "cost": random.uniform(50, 250)
-                            },
-                            {
-                                "name": f"{resource_group}-sql-01",
-                                "type": "SQL Database",
-                                "cost": random.uniform(100, 400)
-                            }
-                        ],
-                        "lastUpdated": datetime.datetime.now().isoformat()
-                    }
-                except Exception as e:
-                    response = {"error": f"Invalid request data: {str(e)}"}
-            else:
-                response = {"error": "Missing request data"}
-        else:
-            response = {"error": "Endpoint not found"}
+        except Exception as e:
+            response = {"error": f"Invalid request data: {str(e)}"}
+    else:
+        response = {"error": "Missing request data"}
+
+    return _encode(response)
+
+
+# Route tables: path -> function taking the request handler and returning the body
+GET_ROUTES = {
+    '/': lambda handler: HOME_BODY,
+    '/health': lambda handler: _stamp(HEALTH_TEMPLATE),
+    '/api/v1/costs/overview': lambda handler: _stamp(OVERVIEW_TEMPLATE),
+    '/api/v1/costs/namespaces': lambda handler: NAMESPACES_BODY,
+    '/api/v1/recommendations/': lambda handler: _stamp(RECOMMENDATIONS_TEMPLATE),
+    '/api/v1/analytics/comparisons': lambda handler: COMPARISONS_BODY,
+    '/api/v1/azure/cost-analysis': azure_cost_analysis,
+}
+
+POST_ROUTES = {
+    '/api/v1/azure/cost-analysis': azure_cost_analysis,
+    '/api/v1/recommendations/generate': lambda handler: GENERATE_BODY,
+}
+
 
-        self.wfile.write(json.dumps(response, indent=2).encode())
+def not_found(handler):
+    """Fallback for unknown paths"""
+    return NOT_FOUND_BODY
+
+
+class CloudCostGuardHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests; every reply carries a Content-Length
+    protocol_version = "HTTP/1.1"
+
+    def _read_body(self):
+        """Consume the request body so the next request on the connection starts clean"""
+        self.request_body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _send(self, body):
+        """Write status line, headers and body in one go"""
+        if PRETTY_JSON in self.headers.get('Accept', ''):
+            body = _encode(json.loads(body), pretty=True)
+        self.log_request(200)
+        self.wfile.write(RESPONSE_HEAD % len(body) + body)
+
+    def do_OPTIONS(self):
+        """Handle CORS preflight requests"""
+        self._read_body()
+        self.log_request(200)
+        self.wfile.write(OPTIONS_RESPONSE)
+
+    def do_GET(self):
+        """Handle GET requests"""
+        self._read_body()
+        path = urlparse(self.path).path
+        self._send(GET_ROUTES.get(path, not_found)(self))
 
     def do_POST(self):
         """Handle POST requests"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        if path == '/api/v1/azure/cost-analysis':
-            # Parse request body for Azure credentials
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length > 0:
-                post_data = self.rfile.read(content_length)
-                try:
-                    import urllib.parse
-                    data = urllib.parse.parse_qs(post_data.decode('utf-8'))
-                    subscription_id = data.get('subscriptionId', [''])[0]
-                    resource_group = data.get('resourceGroup', [''])[0]
-                    
-                    # Generate mock cost data based on inputs
-                    import random
-                    total_cost = random.uniform(1000, 6000)
-                    
-                    response = {
-                        "subscriptionId": subscription_id,
-                        "resourceGroup": resource_group,
-                        "totalCost": total_cost,
-                        "currency": "USD",
-                        "period": "current_month",
-                        "breakdown": {
-                            "compute": random.uniform(500, 2500),
-                            "storage": random.uniform(200, 1200),
-                            "networking": random.uniform(100, 600),
-                            "other": random.uniform(50, 350)
-                        },
-                        "resources": [
-                            {
-                                "name": f"{resource_group}-vm-01",
-                                "type": "Virtual Machine",
-                                "cost": random.uniform(100, 600)
-                            },
-                            {
-                                "name": f"{resource_group}-storage-01",
-                                "type": "Storage Account",
-                                "cost": random.uniform(50, 250)
-                            },
-                            {
-                                "name": f"{resource_group}-sql-01",
-                                "type": "SQL Database",
-                                "cost": random.uniform(100, 400)
-                            }
-                        ],
-                        "lastUpdated": datetime.datetime.now().isoformat()
-                    }
-                except Exception as e:
-                    response = {"error": f"Invalid request data: {str(e)}"}
-            else:
-                response = {"error": "Missing request data"}
-        elif path == '/api/v1/recommendations/generate':
-            response = {
-                "message": "Recommendations generation started",
-                "task_id": "demo-task-123",
-                "status": "in_progress"
-            }
-        else:
-            response = {"error": "Endpoint not found"}
-
-        self.wfile.write(json.dumps(response, indent=2).encode())
+        self._read_body()
+        path = urlparse(self.path).path
+        self._send(POST_ROUTES.get(path, not_found)(self))
 
     def do_PUT(self):
         """Handle PUT requests"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
+        self._read_body()
+        path = urlparse(self.path).path
+        # Status updates carry the recommendation id in the path, so match on the pattern
         if '/api/v1/recommendations/' in path and '/status' in path:
-            response = {
-                "message": "Recommendation status updated successfully",
-                "status": "acknowledged"
-            }
+            self._send(STATUS_UPDATED_BODY)
         else:
-            response = {"error": "Endpoint not found"}
-
-        self.wfile.write(json.dumps(response, indent=2).encode())
+            self._send(NOT_FOUND_BODY)
 
     def log_message(self, format, *args):
         """Custom log messages"""
@@ -322,7 +336,8 @@ class CloudCostGuardHandler(BaseHTTPRequestHandler):
 def run_server():
     """Run the demo server"""
     server_address = ('', 8000)
-    httpd = HTTPServer(server_address, CloudCostGuardHandler)
+    # One thread per connection, so a slow client doesn't hold up everyone else
+    httpd = ThreadingHTTPServer(server_address, CloudCostGuardHandler)
     print("🚀 CloudCostGuard Demo Server Starting...")
     print("📊 Server running on http://localhost:8000")
     print("📚 API Documentation: http://localhost:8000/api/v1/docs")
@@ -1,43 +1,49 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { Lightbulb, AlertTriangle, CheckCircle, Clock, DollarSign } from 'lucide-react';
 import { recommendationsAPI } from '../services/api';
 import { OptimizationRecommendation, RecommendationsSummary } from '../types';
 
+const GENERATE_POLL_INTERVAL_MS = 5000;
+const GENERATE_POLL_ATTEMPTS = 9;
+
 const Recommendations: React.FC = () => {
   const [recommendations, setRecommendations] = useState<OptimizationRecommendation[]>([]);
   const [summary, setSummary] = useState<RecommendationsSummary | null>(null);
   const [loading, setLoading] = useState(true);
+  const [generating, setGenerating] = useState(false);
   const [filter, setFilter] = useState({
     status: '',
     priority: '',
     namespace: ''
   });
 
-  useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const [recs, summaryData] = await Promise.all([
-          recommendationsAPI.getRecommendations(
-            filter.namespace || undefined,
-            'default',
-            filter.status || undefined,
-            filter.priority || undefined,
-            50
-          ),
-          recommendationsAPI.getSummary(filter.namespace || undefined, 'default')
-        ]);
+  const fetchData = useCallback(async (): Promise<RecommendationsSummary | null> => {
+    try {
+      const [recs, summaryData] = await Promise.all([
+        recommendationsAPI.getRecommendations(
+          filter.namespace || undefined,
+          'default',
+          filter.status || undefined,
+          filter.priority || undefined,
+          50
+        ),
+        recommendationsAPI.getSummary(filter.namespace || undefined, 'default')
+      ]);
 
-        setRecommendations(recs);
-        setSummary(summaryData);
-      } catch (error) {
-        console.error('Error fetching recommendations:', error);
-      } finally {
-        setLoading(false);
-      }
-    };
+      setRecommendations(recs);
+      setSummary(summaryData);
+      return summaryData;
+    } catch (error) {
+      console.error('Error fetching recommendations:', error);
+      return null;
+    } finally {
+      setLoading(false);
+    }
+  }, [filter]);
 
+  useEffect(() => {
     fetchData();
-  }, [filter]);
+  }, [fetchData]);
 
   const handleStatusUpdate = async (id: number, status: string) => {
     try {
@@ -57,12 +63,21 @@ const Recommendations: React.FC = () => {
   };
 
   const generateRecommendations = async () => {
+    const previousTotal = summary?.total_recommendations;
+    setGenerating(true);
     try {
+      // Generation runs in the background after the request returns, so poll until the
+      // summary changes. The server caches the summary for up to 30s, hence the long window
       await recommendationsAPI.generateRecommendations('default', 7);
-      // Refresh data
-      window.location.reload();
+      for (let attempt = 0; attempt < GENERATE_POLL_ATTEMPTS; attempt++) {
+        await new Promise((resolve) => setTimeout(resolve, GENERATE_POLL_INTERVAL_MS));
+        const latest = await fetchData();
+        if (latest && latest.total_recommendations !== previousTotal) break;
+      }
     } catch (error) {
       console.error('Error generating recommendations:', error);
+    } finally {
+      setGenerating(false);
     }
   };
 
@@ -101,13 +116,20 @@ const Recommendations: React.FC = () => {
         </div>
         <button
           onClick={generateRecommendations}
+          disabled={generating}
           className="btn btn-primary flex items-center"
         >
           <Lightbulb className="w-4 h-4 mr-2" />
-          Generate Recommendations
+          {generating ? 'Generating...' : 'Generate Recommendations'}
         </button>
       </div>
 
+      {generating && (
+        <div className="card text-gray-600">
+          Recommendation generation has been scheduled. This page will update once new recommendations are stored.
+        </div>
+      )}
+
       {/* Summary Cards */}
       {summary && (
         <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
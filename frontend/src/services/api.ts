@@ -145,7 +145,7 @@ export const recommendationsAPI = {
   generateRecommendations: async (
     clusterName?: string,
     daysBack?: number
-  ): Promise<{ message: string; generated_count: number }> => {
+  ): Promise<{ message: string; cluster_name: string }> => {
     const params = new URLSearchParams();
     if (clusterName) params.append('cluster_name', clusterName || 'default');
     if (daysBack) params.append('days_back', daysBack.toString());